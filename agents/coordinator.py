@@ -1,5 +1,5 @@
 import uuid
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from typing import TypedDict
 from typing_extensions import TypedDict, NotRequired
 from langgraph.graph import StateGraph, END
@@ -7,19 +7,18 @@ from agents.ingestion import IngestionAgent
 from agents.retrieval import RetrievalAgent
 from agents.llm_response import LLMResponseAgent
 from mcp.protocol import MCPMessage
-from langchain_groq import ChatGroq
+from utils.job_queue import get_ingestion_job_queue
+from utils.vector_store import delete_document, get_document_ids
+from utils.ingestion_checkpoint import document_fingerprint
+from utils.clients import get_client_metrics, get_gate, get_groq_llm
 import os
 from dotenv import load_dotenv
-from pydantic import SecretStr, BaseModel, Field
+from pydantic import BaseModel, Field
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.tools import tool
 
 load_dotenv()
 
-# Configure Gemini API
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-
-llm=ChatGroq(model="Gemma2-9b-It",api_key=SecretStr(GROQ_API_KEY) if GROQ_API_KEY else None)
 
 class RewriteQuery(BaseModel):
     """Model for rewriting queries."""
@@ -56,9 +55,9 @@ def rewrite_query_tool(query: str, chat_history: str):
     ])
 
     # Apply LLM with structured output
-    llm_with_structured_output = rewrite_prompt_template | llm.with_structured_output(schema=RewriteQuery)
+    llm_with_structured_output = rewrite_prompt_template | get_groq_llm().with_structured_output(schema=RewriteQuery)
 
-    return llm_with_structured_output.invoke({
+    return get_gate("groq").call(llm_with_structured_output.invoke, {
         "question": query,
         "chat_history": chat_history
     })
@@ -73,6 +72,7 @@ class WorkflowState(TypedDict):
     document_path: NotRequired[str]
     query: NotRequired[str]
     trace_id: str
+    job_id: NotRequired[str]
     ingestion_result: NotRequired[Dict[str, Any]]
     retrieval_result: NotRequired[Dict[str, Any]]
     final_response: NotRequired[Dict[str, Any]]
@@ -87,6 +87,9 @@ class CoordinatorAgent:
         self.retrieval_agent = RetrievalAgent()
         self.llm_response_agent = LLMResponseAgent()
         self.graph = self._build_graph()
+        self.job_queue = get_ingestion_job_queue()
+        # The queue is shared across sessions; remember which jobs are this session's
+        self.job_ids: List[str] = []
         
 
     
@@ -125,6 +128,7 @@ class CoordinatorAgent:
         """Run the ingestion agent."""
         document_path = state.get("document_path")
         trace_id = state.get("trace_id", str(uuid.uuid4()))
+        job_id = state.get("job_id")
         
         # Create MCP message for ingestion agent
         message = MCPMessage(
@@ -136,7 +140,8 @@ class CoordinatorAgent:
         )
         
         # Process the message with ingestion agent
-        response = self.ingestion_agent.process_message(message)
+        progress_callback = self.job_queue.progress_callback(job_id) if job_id else None
+        response = self.ingestion_agent.process_message(message, progress_callback=progress_callback)
         
         # Update state with response
         return {**state, "ingestion_result": response.payload}
@@ -195,6 +200,57 @@ class CoordinatorAgent:
         initial_state: WorkflowState = {"document_path": document_path, "trace_id": trace_id}
         self.graph.invoke(initial_state)
     
+    def submit_document(self, document_path: str) -> str:
+        """Queue a document for background ingestion and return its job ID."""
+        job_id = self.job_queue.submit(document_path, self._run_ingestion_job)
+        self.job_ids.append(job_id)
+        return job_id
+    
+    def get_job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get the progress of an ingestion job."""
+        return self.job_queue.get_status(job_id)
+    
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """Get the progress of this session's ingestion jobs that are still tracked."""
+        jobs = [self.job_queue.get_status(job_id) for job_id in self.job_ids]
+        return [job for job in jobs if job is not None]
+    
+    def retry_job(self, job_id: str) -> Optional[str]:
+        """Retry a failed ingestion job, resuming from its last committed batch."""
+        new_job_id = self.job_queue.retry(job_id)
+        if new_job_id:
+            self.job_ids.append(new_job_id)
+        return new_job_id
+    
+    def delete_document(self, document_path: str) -> int:
+        """Remove a document from the index and return the number of chunks removed."""
+        vector_store = self.ingestion_agent.vector_store
+        if os.path.exists(document_path):
+            document_ids = [document_fingerprint(document_path)]
+        else:
+            # The upload is gone; recover its fingerprint from the chunks stored under this path
+            document_ids = get_document_ids(vector_store, document_path)
+        if not document_ids:
+            return delete_document(vector_store, document_path)
+        
+        # Delete by fingerprint so chunks committed by earlier attempts under other paths go too
+        removed = 0
+        for document_id in document_ids:
+            removed += delete_document(vector_store, document_path, document_id)
+            self.ingestion_agent.checkpoints.remove(document_id)
+        return removed
+    
+    def get_client_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Get saturation metrics (in-flight requests, queue depth, wait time) per LLM provider."""
+        return get_client_metrics()
+    
+    def _run_ingestion_job(self, job_id: str, document_path: str) -> Dict[str, Any]:
+        """Run the ingestion pipeline for a queued job."""
+        trace_id = str(uuid.uuid4())
+        initial_state: WorkflowState = {"document_path": document_path, "trace_id": trace_id, "job_id": job_id}
+        result = self.graph.invoke(initial_state)
+        return result.get("ingestion_result", {})
+    
     def process_query(self, query: str) -> Dict[str, Any]:
         """Process a user query through the retrieval and response pipeline."""
         trace_id = str(uuid.uuid4())
@@ -1,10 +1,11 @@
 import os
-import uuid
+from typing import Any, Callable, Dict, Optional
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
 
 from utils.document_parser import parse_document
-from utils.vector_store import get_vector_store
+from utils.vector_store import add_chunks, get_vector_store, has_chunk
+from utils.ingestion_checkpoint import document_fingerprint, get_ingestion_checkpoints
 from utils.embeddings import get_embeddings_model
 from mcp.protocol import MCPMessage
 
@@ -14,6 +15,7 @@ load_dotenv()
 # Get environment variables
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 1000))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 200))
+INGESTION_BATCH_SIZE = int(os.getenv("INGESTION_BATCH_SIZE", 64))
 
 class IngestionAgent:
     """Agent responsible for document ingestion and preprocessing."""
@@ -27,16 +29,27 @@ class IngestionAgent:
         )
         self.embeddings = get_embeddings_model()
         self.vector_store = get_vector_store(self.embeddings)
+        self.checkpoints = get_ingestion_checkpoints()
     
-    def process_message(self, message: MCPMessage) -> MCPMessage:
-        """Process an incoming MCP message."""
+    def process_message(self, message: MCPMessage, progress_callback: Optional[Callable[..., Any]] = None) -> MCPMessage:
+        """Process an incoming MCP message.
+        
+        Args:
+            message: Incoming MCP message
+            progress_callback: Optional callable invoked as callback(stage, **info) as the
+                document is parsed and its chunks are embedded
+        """
         if message.type == "DOCUMENT_INGESTION":
-            return self._handle_document_ingestion(message)
+            return self._handle_document_ingestion(message, progress_callback)
         else:
             raise ValueError(f"Unsupported message type: {message.type}")
     
-    def _handle_document_ingestion(self, message: MCPMessage) -> MCPMessage:
-        """Handle document ingestion request."""
+    def _handle_document_ingestion(self, message: MCPMessage, progress_callback: Optional[Callable[..., Any]] = None) -> MCPMessage:
+        """Handle document ingestion request.
+        
+        Progress is checkpointed after every committed batch, so ingesting the same
+        document again after a failure resumes from the first batch not yet stored.
+        """
         document_path = message.payload.get("document_path")
         if not document_path:
             return MCPMessage(
@@ -47,6 +60,7 @@ class IngestionAgent:
                 payload={"error": "No document path provided"}
             )
         
+        checkpoint = None
         try:
             # Parse the document
             document_content = parse_document(document_path)
@@ -54,18 +68,34 @@ class IngestionAgent:
             # Split the document into chunks
             chunks = self.text_splitter.split_text(document_content)
             
-            # Create metadata for each chunk
+            # Resume from the last committed batch if this document was ingested before
+            document_id = document_fingerprint(document_path)
+            checkpoint = self._resume_checkpoint(document_id, document_path, len(chunks))
+            start_chunk = checkpoint["chunks_committed"]
+            if progress_callback:
+                progress_callback("parsed", chunks_total=len(chunks), chunks_embedded=start_chunk)
+            
+            # Create metadata for each chunk; IDs are stable so retried batches overwrite
             metadatas = [{
                 "source": os.path.basename(document_path),
-                "chunk_id": str(uuid.uuid4()),
+                "chunk_id": f"{document_id}-{index}",
+                "chunk_index": index,
+                "document_id": document_id,
                 "document_path": document_path
-            } for _ in chunks]
+            } for index in range(len(chunks))]
             
-            # Add chunks to vector store
-            self.vector_store.add_texts(
-                texts=chunks,
-                metadatas=metadatas
-            )
+            # Add chunks to vector store in batches so they become searchable as they land
+            for start in range(start_chunk, len(chunks), INGESTION_BATCH_SIZE):
+                end = min(start + INGESTION_BATCH_SIZE, len(chunks))
+                add_chunks(
+                    self.vector_store,
+                    texts=chunks[start:end],
+                    metadatas=metadatas[start:end],
+                    ids=[metadata["chunk_id"] for metadata in metadatas[start:end]]
+                )
+                checkpoint = self.checkpoints.commit(checkpoint, end)
+                if progress_callback:
+                    progress_callback("embedded", chunks_embedded=end)
             
             # Return success message
             return MCPMessage(
@@ -76,19 +106,55 @@ class IngestionAgent:
                 payload={
                     "status": "success",
                     "document_path": document_path,
-                    "num_chunks": len(chunks)
+                    "document_id": document_id,
+                    "num_chunks": len(chunks),
+                    "resumed_from_chunk": start_chunk
                 }
             )
         
         except Exception as e:
-            # Return error message
+            # Return error message, reporting how far ingestion got
+            payload = {
+                "error": f"Error processing document: {str(e)}",
+                "document_path": document_path
+            }
+            if checkpoint is not None:
+                payload.update({
+                    "status": checkpoint["status"],
+                    "document_id": checkpoint["document_id"],
+                    "num_chunks": checkpoint["num_chunks"],
+                    "chunks_committed": checkpoint["chunks_committed"]
+                })
             return MCPMessage(
                 sender="IngestionAgent",
                 receiver=message.sender,
                 type="ERROR",
                 trace_id=message.trace_id,
-                payload={
-                    "error": f"Error processing document: {str(e)}",
-                    "document_path": document_path
-                }
-            )
\ No newline at end of file
+                payload=payload
+            )
+    
+    def _resume_checkpoint(self, document_id: str, document_path: str, num_chunks: int) -> Dict[str, Any]:
+        """Get the checkpoint to continue from, starting a new one if the old one can't be trusted.
+        
+        A checkpoint is reused only if the document was chunked the same way and
+        its last committed chunk is still in the vector store (which is not the
+        case after a restart without snapshots).
+        """
+        checkpoint = self.checkpoints.get(document_id)
+        if checkpoint is not None:
+            same_chunking = (
+                checkpoint["num_chunks"] == num_chunks
+                and checkpoint["chunk_size"] == CHUNK_SIZE
+                and checkpoint["chunk_overlap"] == CHUNK_OVERLAP
+            )
+            committed = checkpoint["chunks_committed"]
+            if same_chunking and (committed == 0 or has_chunk(self.vector_store, f"{document_id}-{committed - 1}")):
+                return self.checkpoints.resume(checkpoint, document_path)
+        return self.checkpoints.start(
+            document_id,
+            source=os.path.basename(document_path),
+            document_path=document_path,
+            num_chunks=num_chunks,
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP
+        )
\ No newline at end of file
@@ -1,22 +1,14 @@
-import os
-from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
-from pydantic import SecretStr
 from mcp.protocol import MCPMessage
-
-# Load environment variables
-load_dotenv()
-
-# Configure Gemini API
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+from utils.clients import get_gate, get_gemini_llm
 
 class LLMResponseAgent:
     """Agent responsible for generating responses using an LLM."""
     
     def __init__(self):
         """Initialize the LLM response agent."""
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", api_key=SecretStr(GEMINI_API_KEY) if GEMINI_API_KEY else None)
+        self.llm = get_gemini_llm()
+        self.gate = get_gate("gemini")
         self.prompt_template = ChatPromptTemplate.from_template(
             """
                 You are a helpful assistant designed to answer questions based strictly on provided context or prior chat history. Do not use external knowledge or assumptions. If the answer is not found in the context or chat history, respond with "I don't know based on the provided information."
@@ -66,7 +58,7 @@ class LLMResponseAgent:
             
             # Generate response using the LLM
             chain = self.prompt_template | self.llm
-            response = chain.invoke({"context": formatted_context, "question": query, "chat_history":chat_history})
+            response = self.gate.call(chain.invoke, {"context": formatted_context, "question": query, "chat_history":chat_history})
             answer = response.content
 
             
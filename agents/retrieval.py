@@ -1,14 +1,20 @@
 import os
+import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
+from langchain_core.documents import Document
 
 from utils.vector_store import get_vector_store
 from utils.embeddings import get_embeddings_model
 from mcp.protocol import MCPMessage
 from langchain_core.tools import create_retriever_tool
 from langchain_core.tools import tool
-from pydantic import SecretStr,BaseModel,Field
+from pydantic import BaseModel,Field
 from mcp.protocol import MCPMessage
-from langchain_groq import ChatGroq
+from utils.clients import get_gate, get_groq_llm
+from utils.ingestion_checkpoint import get_ingestion_checkpoints
 from langchain_core.prompts import ChatPromptTemplate
 
 
@@ -16,10 +22,40 @@ from langchain_core.prompts import ChatPromptTemplate
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini API
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Retrieval mode: "serial" rewrites only after an empty search, "parallel" searches
+# the original query and its rewritten/decomposed variants at the same time
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "serial")
+PARALLEL_QUERY_VARIANTS = int(os.getenv("PARALLEL_QUERY_VARIANTS", 2))
+PARALLEL_RETRIEVAL_WORKERS = int(os.getenv("PARALLEL_RETRIEVAL_WORKERS", 8))
+# LLM variant generation runs on its own pool so it never delays vector searches
+PARALLEL_VARIANT_WORKERS = int(os.getenv("PARALLEL_VARIANT_WORKERS", 4))
+PARALLEL_RETRIEVAL_TIMEOUT = float(os.getenv("PARALLEL_RETRIEVAL_TIMEOUT", 10.0))
+# Once the original query has returned top_k chunks, wait no longer than this for variants
+PARALLEL_VARIANTS_TIMEOUT = float(os.getenv("PARALLEL_VARIANTS_TIMEOUT", 2.0))
+# Stop waiting for slower branches once top_k chunks score at least this relevance
+PARALLEL_EARLY_STOP_SCORE = float(os.getenv("PARALLEL_EARLY_STOP_SCORE", 0.75))
+# Constant of reciprocal rank fusion
+RRF_K = 60
+
+
+# Thread pools shared by all retrieval agents in the process
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executor_lock = threading.Lock()
+
+def get_retrieval_executor() -> ThreadPoolExecutor:
+    """Get the thread pool that runs variant vector searches for every session."""
+    with _executor_lock:
+        if "search" not in _executors:
+            _executors["search"] = ThreadPoolExecutor(max_workers=PARALLEL_RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+        return _executors["search"]
+
+def get_variants_executor() -> ThreadPoolExecutor:
+    """Get the bounded thread pool that generates query variants with the LLM for every session."""
+    with _executor_lock:
+        if "variants" not in _executors:
+            _executors["variants"] = ThreadPoolExecutor(max_workers=PARALLEL_VARIANT_WORKERS, thread_name_prefix="query-variants")
+        return _executors["variants"]
 
-llm=ChatGroq(model="Gemma2-9b-It",api_key=SecretStr(GROQ_API_KEY) if GROQ_API_KEY else None)
 
 class RewriteQuery(BaseModel):
     """Model for rewriting queries."""
@@ -53,9 +89,42 @@ def rewrite_query_tool(query: str,chat_history:str):
     ])
 
 
-    llm_with_structured_output = rewrite_prompt_template | llm.with_structured_output(schema=RewriteQuery)
+    llm_with_structured_output = rewrite_prompt_template | get_groq_llm().with_structured_output(schema=RewriteQuery)
     
-    return llm_with_structured_output.invoke({"question": query, "chat_history": chat_history})
+    return get_gate("groq").call(llm_with_structured_output.invoke, {"question": query, "chat_history": chat_history})
+
+
+class QueryVariants(BaseModel):
+    """Model for alternative search queries."""
+    queries: List[str] = Field(..., description="Rewritten or decomposed versions of the query")
+
+# Define a tool for generating query variants
+@tool
+def generate_query_variants_tool(query: str, chat_history: str, num_variants: int):
+    """
+    Generate rewritten or decomposed variants of the user query to search alongside the original."""
+
+    system_message = (
+        "You are a search query generator. Given a user question and the chat history, write up to {num_variants} "
+        "alternative search queries that retrieve the information needed to answer it. "
+        "Make each query self-contained using the chat history, and split questions that ask about several things "
+        "into separate queries. Do not include explanations—only output the queries."
+    )
+
+    human_message = (
+        "Conversation History:\n{chat_history}\n\n"
+        "Original Query:\n{question}\n\n"
+        "Alternative Queries:"
+    )
+
+    variants_prompt_template = ChatPromptTemplate.from_messages([
+        ("system", system_message),
+        ("human", human_message)
+    ])
+
+    llm_with_structured_output = variants_prompt_template | get_groq_llm().with_structured_output(schema=QueryVariants)
+
+    return get_gate("groq").call(llm_with_structured_output.invoke, {"question": query, "chat_history": chat_history, "num_variants": num_variants})
 
 
 class RetrievalAgent:
@@ -76,6 +145,8 @@ class RetrievalAgent:
             name="document_retriever",
             description="Useful for answering questions about the uploaded document. Ask specific questions about the content."
         )
+        self.executor = get_retrieval_executor()
+        self.checkpoints = get_ingestion_checkpoints()
 
     
     
@@ -99,16 +170,20 @@ class RetrievalAgent:
             )
         
         try:
-            # Perform similarity search
-            results = self.retriever.invoke(query)
-            results = [doc for doc in results if self._is_valid_content(doc.page_content)]
-            
-            if not results:
-                rewritten_query = rewrite_query_tool.invoke({"query": query, "chat_history": chat_history})
-                query = rewritten_query.query if rewritten_query.query else query
-                # Retry retrieval
+            branches = None
+            if message.payload.get("mode", RETRIEVAL_MODE) == "parallel":
+                results, branches = self._parallel_search(query, chat_history)
+            else:
+                # Perform similarity search
                 results = self.retriever.invoke(query)
                 results = [doc for doc in results if self._is_valid_content(doc.page_content)]
+                
+                if not results:
+                    rewritten_query = rewrite_query_tool.invoke({"query": query, "chat_history": chat_history})
+                    query = rewritten_query.query if rewritten_query.query else query
+                    # Retry retrieval
+                    results = self.retriever.invoke(query)
+                    results = [doc for doc in results if self._is_valid_content(doc.page_content)]
             
             # Extract document chunks and their sources
             retrieved_context = []
@@ -120,20 +195,27 @@ class RetrievalAgent:
                 
                 # Add source information
                 source = f"{doc.metadata.get('source', 'Unknown')}"
+                document_id = doc.metadata.get("document_id")
+                if document_id and self.checkpoints.is_partial(document_id):
+                    source += " (partially ingested)"
                 if source not in sources:
                     sources.append(source)
             
+            payload = {
+                "retrieved_context": retrieved_context,
+                "sources": sources,
+                "query": query
+            }
+            if branches is not None:
+                payload["branches"] = branches
+            
             # Return retrieval results
             return MCPMessage(
                 sender="RetrievalAgent",
                 receiver="LLMResponseAgent",  # Forward to LLM response agent
                 type="RETRIEVAL_RESULT",
                 trace_id=message.trace_id,
-                payload={
-                    "retrieved_context": retrieved_context,
-                    "sources": sources,
-                    "query": query
-                }
+                payload=payload
             )
         
         except Exception as e:
@@ -149,6 +231,133 @@ class RetrievalAgent:
                 }
             )
         
+    def _parallel_search(self, query: str, chat_history: str) -> Tuple[List[Document], List[Dict[str, Any]]]:
+        """Search the original query and its variants concurrently and fuse the results.
+        
+        Variants are generated on a separate bounded pool while the original query
+        is searched on the calling thread, so the plain search never queues behind
+        LLM calls. Each variant is searched as soon as it is available, and results
+        are merged with reciprocal rank fusion. Waiting stops when top_k chunks have
+        scored above the early-stop threshold, when the original query has returned
+        top_k chunks and the variants have used up their time budget, or at the
+        overall timeout. Branches that have not started are then cancelled, and
+        branches that are already running are abandoned (their results are ignored).
+        
+        Returns:
+            Fused documents and a report of each branch's latency and contribution
+        """
+        start = time.monotonic()
+        branches: Dict[Any, Dict[str, Any]] = {}
+        # Set on early stop so queued branches skip their LLM call or search
+        stopped = threading.Event()
+        
+        def submit(executor: ThreadPoolExecutor, name: str, fn, *args):
+            future = executor.submit(fn, *args, stopped)
+            branches[future] = {"name": name, "query": args[0], "status": "running", "submitted_at": time.monotonic()}
+            return future
+        
+        variants_future = submit(get_variants_executor(), "variants", self._query_variants, query, chat_history)
+        
+        # The original query is searched on the calling thread
+        ranked: List[Tuple[Dict[str, Any], List[Tuple[Document, float]]]] = []
+        original: Dict[str, Any] = {"name": "original", "query": query}
+        original_results: List[Tuple[Document, float]] = []
+        try:
+            original_results = self._scored_search(query)
+            original.update(status="completed", results=len(original_results), contribution=0)
+            ranked.append((original, original_results))
+        except Exception as e:
+            original.update(status="failed", error=str(e))
+        original["latency_ms"] = 1000 * (time.monotonic() - start)
+        
+        def strong_enough() -> bool:
+            strong = {self._chunk_key(doc) for _, results in ranked for doc, score in results if score >= PARALLEL_EARLY_STOP_SCORE}
+            return len(strong) >= self.top_k
+        
+        pending = {variants_future}
+        deadline = start + PARALLEL_RETRIEVAL_TIMEOUT
+        # With a full result set from the original query, variants only get their own budget
+        if len(original_results) >= self.top_k:
+            variants_deadline = min(deadline, start + PARALLEL_VARIANTS_TIMEOUT)
+        else:
+            variants_deadline = deadline
+        while pending and not strong_enough():
+            until = variants_deadline if variants_future in pending else deadline
+            done, pending = wait(pending, timeout=max(0.0, until - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                branch = branches[future]
+                branch["latency_ms"] = 1000 * (time.monotonic() - branch.pop("submitted_at"))
+                try:
+                    result = future.result()
+                except Exception as e:
+                    branch["status"] = "failed"
+                    branch["error"] = str(e)
+                    continue
+                branch["status"] = "completed"
+                if branch["name"] == "variants":
+                    branch["variants"] = result
+                    for i, variant in enumerate(result):
+                        pending.add(submit(get_retrieval_executor(), f"variant_{i + 1}", self._scored_search, variant))
+                else:
+                    branch["results"] = len(result)
+                    branch["contribution"] = 0
+                    ranked.append((branch, result))
+        
+        stopped.set()
+        for future in pending:
+            branch = branches[future]
+            # A running thread-pool task cannot be interrupted, only left to finish
+            branch["status"] = "cancelled" if future.cancel() else "abandoned"
+            branch["latency_ms"] = 1000 * (time.monotonic() - branch.pop("submitted_at"))
+        
+        # Reciprocal rank fusion across branches
+        fused: Dict[str, float] = {}
+        documents: Dict[str, Document] = {}
+        contributors: Dict[str, List[Dict[str, Any]]] = {}
+        for branch, results in ranked:
+            for rank, (doc, _) in enumerate(results):
+                key = self._chunk_key(doc)
+                fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+                documents.setdefault(key, doc)
+                contributors.setdefault(key, []).append(branch)
+        top_keys = sorted(fused, key=fused.get, reverse=True)[:self.top_k]
+        
+        # Credit each branch with the fused chunks it returned
+        for key in top_keys:
+            for branch in contributors[key]:
+                branch["contribution"] += 1
+        
+        return [documents[key] for key in top_keys], [original] + list(branches.values())
+    
+    def _scored_search(self, query: str, stopped: Optional[threading.Event] = None) -> List[Tuple[Document, float]]:
+        """Run a similarity search returning valid chunks with their relevance scores."""
+        if stopped is not None and stopped.is_set():
+            return []
+        results = self.vector_store.similarity_search_with_relevance_scores(query, k=self.top_k)
+        return [(doc, score) for doc, score in results if self._is_valid_content(doc.page_content)]
+    
+    def _query_variants(self, query: str, chat_history: str, stopped: Optional[threading.Event] = None) -> List[str]:
+        """Generate distinct rewritten or decomposed variants of the query."""
+        if stopped is not None and stopped.is_set():
+            return []
+        variants = generate_query_variants_tool.invoke({
+            "query": query,
+            "chat_history": chat_history,
+            "num_variants": PARALLEL_QUERY_VARIANTS
+        })
+        unique = []
+        for variant in variants.queries:
+            variant = variant.strip()
+            if variant and variant != query and variant not in unique:
+                unique.append(variant)
+        return unique[:PARALLEL_QUERY_VARIANTS]
+    
+    def _chunk_key(self, doc: Document) -> str:
+        """Get a key identifying a chunk across searches."""
+        return doc.metadata.get("chunk_id") or doc.page_content
+    
     def _is_valid_content(self, content: str) -> bool:
         """Check if content is meaningful (not just dashes or empty)."""
         stripped = content.strip().replace("-", "")
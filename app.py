@@ -4,10 +4,14 @@ import uuid
 import tempfile
 from dotenv import load_dotenv
 from agents.coordinator import CoordinatorAgent
+from utils.job_queue import ACTIVE_JOB_STATES, JOB_COMPLETED, JOB_FAILED
 
 # Load environment variables
 load_dotenv()
 
+# Seconds between ingestion status refreshes in the sidebar
+INGESTION_POLL_INTERVAL = float(os.getenv("INGESTION_POLL_INTERVAL", 1.0))
+
 # Set page configuration
 st.set_page_config(page_title="Agentic RAG Chatbot", layout="wide")
 
@@ -16,6 +20,8 @@ if "conversation" not in st.session_state:
     st.session_state.conversation = []
 if "uploaded_files" not in st.session_state:
     st.session_state.uploaded_files = []
+if "ingestion_jobs" not in st.session_state:
+    st.session_state.ingestion_jobs = {}
 if "coordinator" not in st.session_state:
     st.session_state.coordinator = CoordinatorAgent()
 
@@ -36,29 +42,63 @@ with st.sidebar:
         new_files = [f for f in uploaded_files if f.name not in [existing.name for existing in st.session_state.uploaded_files]]
         
         if new_files:
-            with st.spinner("Processing documents..."):
-                for file in new_files:
-                    # Save the file temporarily
-                    temp_dir = os.path.join(tempfile.gettempdir(), str(uuid.uuid4()))
-                    os.makedirs(temp_dir, exist_ok=True)
-                    temp_path = os.path.join(temp_dir, file.name)
-                    
-                    with open(temp_path, "wb") as f:
-                        f.write(file.getvalue())
-                    
-                    # Process the file with the coordinator agent
-                    st.session_state.coordinator.process_document(temp_path)
-                    
-                    # Add to session state
-                    st.session_state.uploaded_files.append(file)
+            for file in new_files:
+                # Save the file temporarily
+                temp_dir = os.path.join(tempfile.gettempdir(), str(uuid.uuid4()))
+                os.makedirs(temp_dir, exist_ok=True)
+                temp_path = os.path.join(temp_dir, file.name)
+                
+                with open(temp_path, "wb") as f:
+                    f.write(file.getvalue())
+                
+                # Queue the file for background ingestion
+                job_id = st.session_state.coordinator.submit_document(temp_path)
+                st.session_state.ingestion_jobs[file.name] = job_id
                 
-                st.success(f"Processed {len(new_files)} new documents")
+                # Add to session state
+                st.session_state.uploaded_files.append(file)
+            
+            st.info(f"Queued {len(new_files)} new documents for processing")
     
-    # Display uploaded files
+    # Display uploaded files with their ingestion progress
     if st.session_state.uploaded_files:
-        st.write("Uploaded Documents:")
-        for file in st.session_state.uploaded_files:
-            st.write(f"- {file.name}")
+        jobs = [st.session_state.coordinator.get_job_status(job_id) for job_id in st.session_state.ingestion_jobs.values()]
+        has_active_jobs = any(job and job["status"] in ACTIVE_JOB_STATES for job in jobs)
+        
+        @st.fragment(run_every=INGESTION_POLL_INTERVAL if has_active_jobs else None)
+        def show_ingestion_status():
+            """Poll and display the ingestion status of uploaded documents."""
+            st.write("Uploaded Documents:")
+            still_active = False
+            for name, job_id in st.session_state.ingestion_jobs.items():
+                job = st.session_state.coordinator.get_job_status(job_id)
+                if job is None:
+                    st.write(f"- {name}")
+                elif job["status"] == JOB_COMPLETED:
+                    st.write(f"- {name} ({job['chunks_embedded']} chunks)")
+                elif job["status"] == JOB_FAILED:
+                    if job["partial"]:
+                        st.write(f"- {name} (partially ingested: {job['chunks_embedded']}/{job['chunks_total']} chunks)")
+                    else:
+                        st.write(f"- {name} (failed)")
+                    st.caption(job["error"])
+                    # Retrying resumes from the last committed batch
+                    if st.button("Retry", key=f"retry-{job_id}"):
+                        st.session_state.ingestion_jobs[name] = st.session_state.coordinator.retry_job(job_id)
+                        st.rerun()
+                else:
+                    still_active = True
+                    if job["chunks_total"]:
+                        label = f"{name}: {job['chunks_embedded']}/{job['chunks_total']} chunks embedded ({job['chunks_per_second']:.1f} chunks/s)"
+                    else:
+                        label = f"{name}: {job['status']}..."
+                    st.progress(job["progress"], text=label)
+            
+            # Rerun the full app once everything is done so polling stops
+            if has_active_jobs and not still_active:
+                st.rerun()
+        
+        show_ingestion_status()
 
 # Main chat interface
 st.header("Chat with your documents")
@@ -0,0 +1,320 @@
+"""Concurrent-session load test for CoordinatorAgent.
+
+Simulates N Streamlit sessions in one process. Each session has its own
+CoordinatorAgent, uploads its own documents through the background ingestion
+queue and then asks a series of follow-up questions. The Groq, Gemini and
+embedding backends are replaced with stand-ins with configurable latency and
+error rates, so runs are repeatable and cost nothing.
+
+Usage:
+    python -m benchmarks.load_test --sessions 20 --questions 5 --output report.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import atexit
+import shutil
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# The stand-ins need no API keys, and runs must not touch the real snapshot
+# or leave ingestion checkpoints behind
+os.environ.setdefault("GEMINI_API_KEY", "stand-in")
+os.environ.setdefault("GROQ_API_KEY", "stand-in")
+os.environ.setdefault("VECTOR_SNAPSHOT_ENABLED", "false")
+if "INGESTION_CHECKPOINT_DIRECTORY" not in os.environ:
+    os.environ["INGESTION_CHECKPOINT_DIRECTORY"] = tempfile.mkdtemp(prefix="load-test-checkpoints-")
+    atexit.register(shutil.rmtree, os.environ["INGESTION_CHECKPOINT_DIRECTORY"], True)
+
+from agents import coordinator as coordinator_module
+from agents import retrieval as retrieval_module
+from agents.coordinator import CoordinatorAgent
+from benchmarks.stand_ins import StandInBackend, StandInChatModel, StandInEmbeddings
+from utils.clients import get_client_metrics, set_client
+from utils.embeddings import get_query_batching_metrics, set_embeddings_model
+from utils.job_queue import ACTIVE_JOB_STATES, JOB_FAILED
+
+# Vocabulary used to generate distinct synthetic documents per session
+TOPICS = ["pricing", "warranty", "installation", "safety", "maintenance", "shipping", "support", "licensing"]
+WORDS = ["system", "device", "customer", "policy", "report", "module", "service", "network", "storage", "update"]
+
+
+class StageRecorder:
+    """Thread-safe collector of per-stage latencies and outcomes."""
+
+    def __init__(self):
+        """Initialize the recorder."""
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, stage: str, seconds: float, error: bool = False) -> None:
+        """Record one observation of a stage."""
+        with self._lock:
+            self.latencies.setdefault(stage, []).append(seconds)
+            if error:
+                self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    def wrap(self, stage: str, fn: Callable[..., Any], only_if: Optional[Callable[[Any], bool]] = None) -> Callable[..., Any]:
+        """Wrap an agent's process_message so its latency and ERROR replies are recorded.
+
+        Args:
+            stage: Stage name to record under
+            fn: Bound process_message method
+            only_if: Optional predicate on the incoming message; other messages are not recorded
+        """
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            if only_if is not None and not only_if(args[0]):
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                response = fn(*args, **kwargs)
+            except Exception:
+                self.record(stage, time.perf_counter() - start, error=True)
+                raise
+            self.record(stage, time.perf_counter() - start, error=response.type == "ERROR")
+            return response
+        return timed
+
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        """Get count, throughput, error count and latency percentiles per stage."""
+        with self._lock:
+            return {
+                stage: {
+                    "count": len(values),
+                    "per_second": len(values) / elapsed if elapsed else 0.0,
+                    "errors": self.errors.get(stage, 0),
+                    "p50_ms": 1000 * percentile(values, 50),
+                    "p95_ms": 1000 * percentile(values, 95),
+                    "p99_ms": 1000 * percentile(values, 99),
+                    "max_ms": 1000 * max(values),
+                }
+                for stage, values in sorted(self.latencies.items())
+            }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def write_documents(directory: str, session: int, count: int, paragraphs: int, rng: random.Random) -> List[Dict[str, str]]:
+    """Write synthetic text documents for a session.
+
+    Returns:
+        One dict per document with its path and a question it can answer
+    """
+    documents = []
+    for index in range(count):
+        topic = TOPICS[(session + index) % len(TOPICS)]
+        code = f"S{session}D{index}"
+        lines = []
+        for p in range(paragraphs):
+            filler = " ".join(rng.choice(WORDS) for _ in range(60))
+            lines.append(f"Section {p} of the {topic} guide {code}. The {topic} limit for {code} section {p} is {rng.randint(1, 999)} units. {filler}")
+        path = os.path.join(directory, f"session{session}_doc{index}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n\n".join(lines))
+        documents.append({"path": path, "topic": topic, "code": code})
+    return documents
+
+
+def run_session(session: int, args: argparse.Namespace, directory: str, recorder: StageRecorder) -> None:
+    """Simulate one chat session: upload documents, wait for ingestion, ask follow-ups."""
+    rng = random.Random(args.seed + session)
+    coordinator = CoordinatorAgent()
+    # Queries also pass through the ingestion node without a document; only time real ingestions
+    coordinator.ingestion_agent.process_message = recorder.wrap(
+        "ingestion", coordinator.ingestion_agent.process_message,
+        only_if=lambda message: bool(message.payload.get("document_path"))
+    )
+    coordinator.retrieval_agent.process_message = recorder.wrap("retrieval", coordinator.retrieval_agent.process_message)
+    coordinator.llm_response_agent.process_message = recorder.wrap("llm_response", coordinator.llm_response_agent.process_message)
+
+    # Upload through the background queue, as the Streamlit sidebar does
+    documents = write_documents(directory, session, args.documents, args.paragraphs, rng)
+    job_ids = [coordinator.submit_document(document["path"]) for document in documents]
+    while any(coordinator.get_job_status(job_id)["status"] in ACTIVE_JOB_STATES for job_id in job_ids):
+        time.sleep(0.02)
+    for job_id in job_ids:
+        job = coordinator.get_job_status(job_id)
+        recorder.record("ingestion_queue_wait", job["queue_seconds"])
+        recorder.record("ingestion_job", job["finished_at"] - job["queued_at"], error=job["status"] == JOB_FAILED)
+
+    # First question names the document, follow-ups rely on the chat history
+    for turn in range(args.questions):
+        document = rng.choice(documents)
+        if turn == 0:
+            query = f"What is the {document['topic']} limit for {document['code']} section {rng.randrange(args.paragraphs)}?"
+        else:
+            query = f"And what about section {rng.randrange(args.paragraphs)}?"
+        start = time.perf_counter()
+        try:
+            coordinator.process_query(query)
+            recorder.record("query", time.perf_counter() - start)
+        except Exception:
+            recorder.record("query", time.perf_counter() - start, error=True)
+        time.sleep(args.think_time_ms / 1000.0)
+
+
+def process_memory() -> Dict[str, Optional[float]]:
+    """Get the current and peak resident set size of the process in MB.
+
+    The current size is only available on Linux; elsewhere only the peak is reported.
+    """
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return {"rss_mb": int(fields["VmRSS"].split()[0]) / 1024, "rss_peak_mb": int(fields["VmHWM"].split()[0]) / 1024}
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return {"rss_mb": None, "rss_peak_mb": None}
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return {"rss_mb": None, "rss_peak_mb": peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024}
+
+
+def sample_resources(started: float) -> Dict[str, Any]:
+    """Record current memory use and provider queueing."""
+    sample = {"t_seconds": time.perf_counter() - started, **process_memory()}
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        sample["traced_memory_mb"] = current / 2 ** 20
+        sample["traced_peak_mb"] = peak / 2 ** 20
+    sample.update({
+        "chat_memory_entries": len(coordinator_module.memory),
+        "threads": threading.active_count(),
+        "providers": {name: {key: metrics[key] for key in ("in_flight", "queue_depth")} for name, metrics in get_client_metrics().items()},
+    })
+    return sample
+
+
+def sample_periodically(stop: threading.Event, samples: List[Dict[str, Any]], started: float, interval: float) -> None:
+    """Sample resources every interval seconds until stopped."""
+    while not stop.is_set():
+        samples.append(sample_resources(started))
+        stop.wait(interval)
+
+
+def run_load_test(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the load test and build its report."""
+    if args.retrieval_mode:
+        retrieval_module.RETRIEVAL_MODE = args.retrieval_mode
+
+    chat_backend = StandInBackend(args.llm_latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate, seed=args.seed)
+    embed_backend = StandInBackend(args.embed_latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate, seed=args.seed + 1)
+    set_client("groq", StandInChatModel(backend=chat_backend))
+    set_client("gemini", StandInChatModel(backend=chat_backend, false_answer_rate=args.false_answer_rate))
+    set_embeddings_model(StandInEmbeddings(embed_backend, per_text_ms=args.embed_per_text_ms))
+
+    recorder = StageRecorder()
+    samples: List[Dict[str, Any]] = []
+    stop = threading.Event()
+    # Tracing slows every allocation, so it skews latency and throughput; off by default
+    if args.trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    sampler = threading.Thread(target=sample_periodically, args=(stop, samples, started, args.sample_interval), daemon=True)
+    sampler.start()
+
+    with tempfile.TemporaryDirectory(prefix="load-test-") as directory:
+        with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+            futures = []
+            for session in range(args.sessions):
+                futures.append(executor.submit(run_session, session, args, directory, recorder))
+                time.sleep(args.ramp_up_ms / 1000.0)
+            for future in futures:
+                future.result()
+
+    elapsed = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+    # Sample once more so the timeline covers the whole run
+    samples.append(sample_resources(started))
+    if args.trace_memory:
+        tracemalloc.stop()
+
+    return {
+        "config": vars(args),
+        "elapsed_seconds": elapsed,
+        "queries_per_second": len(recorder.latencies.get("query", [])) / elapsed,
+        "stages": recorder.summary(elapsed),
+        "providers": get_client_metrics(),
+        "query_embedding_batching": get_query_batching_metrics(),
+        "backend_calls": {"chat": chat_backend.calls, "embeddings": embed_backend.calls},
+        "timeline": samples,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Print a human-readable summary of a report."""
+    config = report["config"]
+    print(f"{config['sessions']} sessions x {config['questions']} questions in {report['elapsed_seconds']:.1f}s "
+          f"({report['queries_per_second']:.2f} queries/s)")
+    print(f"{'stage':<22}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<22}{stats['count']:>7}{stats['errors']:>8}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+    for name, metrics in report["providers"].items():
+        print(f"{name}: {metrics['requests']} requests, avg wait {1000 * metrics['avg_wait_seconds']:.1f} ms, "
+              f"max wait {1000 * metrics['max_wait_seconds']:.1f} ms, {metrics['rate_limited']} rate limited, {metrics['errors']} errors")
+    if report["query_embedding_batching"]:
+        batching = report["query_embedding_batching"]
+        print(f"query embedding batches: {batching['batches']} (avg size {batching['avg_batch_size']:.1f}, "
+              f"avg added wait {batching['avg_added_wait_ms']:.1f} ms)")
+    if report["timeline"]:
+        first, last = report["timeline"][0], report["timeline"][-1]
+        peak_queue = max((p["queue_depth"] for s in report["timeline"] for p in s["providers"].values()), default=0)
+        if last["rss_mb"] is not None:
+            memory = f"RSS {first['rss_mb']:.1f} MB -> {last['rss_mb']:.1f} MB (peak {last['rss_peak_mb']:.1f} MB)"
+        else:
+            memory = f"peak RSS {last['rss_peak_mb']:.1f} MB" if last["rss_peak_mb"] is not None else "RSS unavailable"
+        if "traced_memory_mb" in last:
+            memory += f", traced {first['traced_memory_mb']:.1f} MB -> {last['traced_memory_mb']:.1f} MB (peak {last['traced_peak_mb']:.1f} MB)"
+        print(f"{memory}, chat memory entries {last['chat_memory_entries']}, peak provider queue depth {peak_queue}")
+
+
+def main(argv: List[str] = None) -> None:
+    """Parse arguments, run the load test and print or save the report."""
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for CoordinatorAgent")
+    parser.add_argument("--sessions", type=int, default=10, help="Number of concurrent chat sessions")
+    parser.add_argument("--questions", type=int, default=5, help="Questions per session")
+    parser.add_argument("--documents", type=int, default=2, help="Documents uploaded per session")
+    parser.add_argument("--paragraphs", type=int, default=20, help="Paragraphs per document")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="Mean stand-in chat model latency")
+    parser.add_argument("--embed-latency-ms", type=float, default=80.0, help="Mean stand-in embedding call latency")
+    parser.add_argument("--embed-per-text-ms", type=float, default=1.0, help="Extra embedding latency per text in a batch")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="Uniform latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of backend calls that fail")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of backend calls answered with a 429")
+    parser.add_argument("--false-answer-rate", type=float, default=0.1, help="Fraction of answers that trigger a query rewrite")
+    parser.add_argument("--think-time-ms", type=float, default=200.0, help="Pause between a session's questions")
+    parser.add_argument("--ramp-up-ms", type=float, default=50.0, help="Delay between session starts")
+    parser.add_argument("--retrieval-mode", choices=["serial", "parallel"], help="Override RETRIEVAL_MODE")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="Seconds between resource samples")
+    parser.add_argument("--trace-memory", action="store_true", help="Also trace Python allocations with tracemalloc (slows the run)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--output", help="Write the full JSON report to this file")
+    args = parser.parse_args(argv)
+
+    report = run_load_test(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
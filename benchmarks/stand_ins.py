@@ -0,0 +1,150 @@
+import re
+import time
+import random
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, get_origin
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+
+class StandInRateLimitError(Exception):
+    """Simulated provider 429 response."""
+
+    def __init__(self, retry_after: float):
+        """Initialize the error with the Retry-After delay the provider would send."""
+        super().__init__("Simulated rate limit")
+        self.status_code = 429
+        self.response = type("Response", (), {"status_code": 429, "headers": {"retry-after": str(retry_after)}})()
+
+
+class StandInBackend:
+    """Latency and failure model shared by the stand-in chat and embedding backends."""
+
+    def __init__(self, latency_ms: float, jitter_ms: float = 0.0, error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: float = 0.05, seed: int = 0):
+        """Initialize the backend.
+
+        Args:
+            latency_ms: Mean latency of a call
+            jitter_ms: Uniform jitter added to or removed from the latency
+            error_rate: Fraction of calls that fail with an error
+            rate_limit_rate: Fraction of calls that fail with a 429 and a Retry-After header
+            retry_after: Retry-After delay sent with simulated 429s, in seconds
+            seed: Random seed
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def roll(self, key: str) -> float:
+        """Get a number in [0, 1) determined by the seed and a key.
+
+        Unlike draws from the shared generator, the result does not depend on
+        the order in which concurrent sessions reach the backend.
+        """
+        digest = hashlib.md5(f"{self.seed}:{key}".encode()).digest()
+        return int.from_bytes(digest[:8], "little") / 2 ** 64
+
+    def simulate(self, extra_ms: float = 0.0) -> None:
+        """Sleep for one call's latency, then maybe raise a simulated failure."""
+        with self._lock:
+            self.calls += 1
+            latency = self.latency_ms + extra_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+            roll = self._random.random()
+        time.sleep(max(0.0, latency) / 1000.0)
+        if roll < self.rate_limit_rate:
+            raise StandInRateLimitError(self.retry_after)
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise RuntimeError("Simulated provider error")
+
+
+class StandInChatModel(BaseChatModel):
+    """Chat model that answers from the prompt after a simulated delay.
+
+    Free-text calls answer with the start of the context in the prompt (or
+    "false" for a false_answer_rate share of questions, chosen by the backend
+    seed, to exercise the rewrite path).
+    Structured-output calls fill string fields with the latest query and list
+    fields with distinct variants of it (as many as the prompt asks for, else
+    two), so parallel retrieval fans out to variant branches.
+    """
+
+    backend: Any
+    false_answer_rate: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        """Type of the chat model."""
+        return "stand-in"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        """Generate an answer after the simulated latency."""
+        self.backend.simulate()
+        question = re.search(r"User Question:\s*(.*)", messages[-1].content)
+        if self.backend.roll(question.group(1).strip() if question else messages[-1].content) < self.false_answer_rate:
+            answer = "false"
+        else:
+            match = re.search(r"Context 1: (.{0,200})", messages[-1].content, re.DOTALL)
+            answer = match.group(1).strip() if match else "false"
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=answer))])
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> Any:
+        """Return a runnable producing schema instances after the simulated latency."""
+        def respond(prompt: Any) -> Any:
+            self.backend.simulate()
+            text = prompt.to_messages()[-1].content
+            match = re.search(r"Query:\n(.*?)\n", text)
+            query = match.group(1) if match else text[-200:]
+            count = re.search(r"up to (\d+)", text)
+            variants = [f"{query} (variant {i + 1})" for i in range(int(count.group(1)) if count else 2)]
+            fields: Dict[str, Any] = {}
+            for name, field in schema.model_fields.items():
+                fields[name] = variants if get_origin(field.annotation) is list else query
+            return schema(**fields)
+
+        return RunnableLambda(respond)
+
+
+class StandInEmbeddings(Embeddings):
+    """Deterministic hashed bag-of-words embeddings with simulated latency."""
+
+    def __init__(self, backend: StandInBackend, dimension: int = 256, per_text_ms: float = 0.0):
+        """Initialize the embeddings.
+
+        Args:
+            backend: Latency and failure model
+            dimension: Embedding dimension
+            per_text_ms: Extra latency per text in a batched call
+        """
+        self.backend = backend
+        self.dimension = dimension
+        self.per_text_ms = per_text_ms
+
+    def embed_documents(self, texts: List[str], **kwargs: Any) -> List[List[float]]:
+        """Embed a batch of texts in one simulated call."""
+        self.backend.simulate(self.per_text_ms * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query in one simulated call."""
+        self.backend.simulate(self.per_text_ms)
+        return self._vector(text)
+
+    def _vector(self, text: str) -> List[float]:
+        """Hash the words of a text into a normalized vector."""
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode()).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimension] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
@@ -0,0 +1,291 @@
+import os
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+import httpx
+from dotenv import load_dotenv
+from langchain_core.exceptions import ModelRateLimitError
+from langchain_groq import ChatGroq
+from langchain_google_genai import ChatGoogleGenerativeAI
+from pydantic import SecretStr
+
+# Load environment variables
+load_dotenv()
+
+# Get API keys from environment
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# Models served through the shared clients
+GROQ_MODEL = "Gemma2-9b-It"
+GEMINI_MODEL = "gemini-2.5-flash"
+
+# Connection pool settings for the shared HTTP client
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 20))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 10))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30.0))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 60.0))
+
+# Per-provider limits (a requests-per-minute value of 0 disables rate limiting)
+PROVIDER_LIMITS = {
+    "groq": {
+        "max_concurrency": int(os.getenv("GROQ_MAX_CONCURRENCY", 4)),
+        "requests_per_minute": float(os.getenv("GROQ_REQUESTS_PER_MINUTE", 30)),
+    },
+    "gemini": {
+        "max_concurrency": int(os.getenv("GEMINI_MAX_CONCURRENCY", 8)),
+        "requests_per_minute": float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", 0)),
+    },
+}
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", 1.0))
+
+
+class ProviderGate:
+    """Concurrency limiter, token-bucket rate limiter and retry policy for one provider."""
+
+    def __init__(self, name: str, max_concurrency: int, requests_per_minute: float, max_retries: int = LLM_MAX_RETRIES):
+        """Initialize the gate.
+
+        Args:
+            name: Provider name, used in metrics
+            max_concurrency: Maximum number of in-flight requests
+            requests_per_minute: Sustained request rate (0 disables rate limiting)
+            max_retries: Number of retries for rate-limited requests
+        """
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+
+        # Token bucket allowing bursts of up to max_concurrency requests
+        self._rate = requests_per_minute / 60.0
+        self._capacity = float(max(1, max_concurrency))
+        self._tokens = self._capacity
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+
+        # Saturation metrics
+        self._waiting = 0
+        self._in_flight = 0
+        self._requests = 0
+        self._rate_limited = 0
+        self._retries = 0
+        self._errors = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Call fn once a concurrency slot and a rate token are available.
+
+        Rate-limited calls are retried after the provider's Retry-After delay, or
+        with exponential backoff when the provider does not send one.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                with self._lock:
+                    if delay is None:
+                        self._errors += 1
+                    else:
+                        self._rate_limited += 1
+                if delay is None or attempt == self.max_retries:
+                    raise
+                # Pause the whole provider, not only this caller
+                with self._lock:
+                    self._retries += 1
+                    self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                self._semaphore.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Get saturation metrics for this provider."""
+        with self._lock:
+            return {
+                "provider": self.name,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "queue_depth": self._waiting,
+                "requests": self._requests,
+                "rate_limited": self._rate_limited,
+                "retries": self._retries,
+                "errors": self._errors,
+                "avg_wait_seconds": self._total_wait / self._requests if self._requests else 0.0,
+                "max_wait_seconds": self._max_wait,
+            }
+
+    def _acquire(self) -> None:
+        """Block until a concurrency slot and a rate token are available."""
+        start = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        self._semaphore.acquire()
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    delay = self._blocked_until - now
+                    if delay <= 0:
+                        delay = self._take_token(now)
+                    if delay <= 0:
+                        break
+                time.sleep(delay)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        finally:
+            waited = time.monotonic() - start
+            with self._lock:
+                self._waiting -= 1
+        with self._lock:
+            self._in_flight += 1
+            self._requests += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+
+    def _take_token(self, now: float) -> float:
+        """Take a token from the bucket, returning how long to wait if none is available."""
+        if self._rate <= 0:
+            return 0.0
+        self._tokens = min(self._capacity, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self._rate
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Get the delay before retrying a failed call, or None if it should not be retried."""
+        rate_limit_error = self._rate_limit_error(error)
+        if rate_limit_error is None:
+            return None
+
+        # Prefer the Retry-After header of whichever error in the chain carries the response
+        for e in (rate_limit_error, error):
+            headers = getattr(getattr(e, "response", None), "headers", None) or {}
+            retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+            if retry_after:
+                try:
+                    return max(0.0, float(retry_after))
+                except ValueError:
+                    try:
+                        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+                    except (TypeError, ValueError):
+                        pass
+        return LLM_RETRY_BACKOFF * (2 ** attempt)
+
+    def _rate_limit_error(self, error: Exception) -> Optional[BaseException]:
+        """Find the rate-limit error in an exception's cause chain, if there is one.
+
+        LangChain integrations wrap provider errors (e.g. Gemini raises a
+        ModelRateLimitError or GoogleGenerativeAIError from a google-genai
+        ClientError), so the status code may only be on a chained exception.
+        """
+        seen = set()
+        e: Optional[BaseException] = error
+        while e is not None and id(e) not in seen:
+            seen.add(id(e))
+            if isinstance(e, ModelRateLimitError):
+                return e
+            response = getattr(e, "response", None)
+            status = getattr(e, "status_code", None) or getattr(response, "status_code", None) or getattr(e, "code", None)
+            if status == 429 or type(e).__name__ in ("RateLimitError", "ResourceExhausted"):
+                return e
+            e = e.__cause__ or e.__context__
+        return None
+
+
+# Shared clients and gates, created on first use
+_gates: Dict[str, ProviderGate] = {}
+_clients: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def get_gate(provider: str) -> ProviderGate:
+    """Get the shared gate that all calls to a provider must go through.
+
+    Args:
+        provider: Provider name ("groq" or "gemini")
+
+    Returns:
+        Provider gate instance
+    """
+    with _lock:
+        if provider not in _gates:
+            limits = PROVIDER_LIMITS.get(provider, {"max_concurrency": 4, "requests_per_minute": 0})
+            _gates[provider] = ProviderGate(provider, **limits)
+        return _gates[provider]
+
+
+def get_http_client() -> httpx.Client:
+    """Get the shared keep-alive HTTP client used by the LLM clients."""
+    with _lock:
+        if "http" not in _clients:
+            _clients["http"] = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                ),
+                timeout=HTTP_TIMEOUT
+            )
+        return _clients["http"]
+
+
+def get_groq_llm() -> ChatGroq:
+    """Get the shared Groq chat model.
+
+    Retries are left to the provider gate, so calls should be wrapped with
+    get_gate("groq").call(...).
+    """
+    http_client = get_http_client()
+    with _lock:
+        if "groq" not in _clients:
+            _clients["groq"] = ChatGroq(
+                model=GROQ_MODEL,
+                api_key=SecretStr(GROQ_API_KEY) if GROQ_API_KEY else None,
+                http_client=http_client,
+                max_retries=0
+            )
+        return _clients["groq"]
+
+
+def get_gemini_llm() -> ChatGoogleGenerativeAI:
+    """Get the shared Gemini chat model.
+
+    Retries are left to the provider gate, so calls should be wrapped with
+    get_gate("gemini").call(...).
+    """
+    with _lock:
+        if "gemini" not in _clients:
+            _clients["gemini"] = ChatGoogleGenerativeAI(
+                model=GEMINI_MODEL,
+                api_key=SecretStr(GEMINI_API_KEY) if GEMINI_API_KEY else None,
+                max_retries=0
+            )
+        return _clients["gemini"]
+
+
+def set_client(provider: str, client: Any) -> None:
+    """Replace the shared chat model for a provider, e.g. with a stand-in backend for load tests.
+
+    Args:
+        provider: Provider name ("groq" or "gemini")
+        client: Chat model to use for the provider
+    """
+    with _lock:
+        _clients[provider] = client
+
+
+def get_client_metrics() -> Dict[str, Dict[str, Any]]:
+    """Get saturation metrics for every provider gate in use."""
+    with _lock:
+        gates = list(_gates.values())
+    return {gate.name: gate.metrics() for gate in gates}
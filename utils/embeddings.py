@@ -1,26 +1,236 @@
 import os
-from typing import List
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from pydantic import SecretStr
 
+from utils.clients import ProviderGate, get_gate
+
 # Load environment variables
 load_dotenv()
 
 # Get API key from environment
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+EMBEDDING_MODEL = "models/embedding-001"
+
+# Query embedding micro-batching (a window of 0 disables batching)
+QUERY_EMBED_BATCH_WINDOW_MS = float(os.getenv("QUERY_EMBED_BATCH_WINDOW_MS", 5))
+QUERY_EMBED_MAX_BATCH_SIZE = int(os.getenv("QUERY_EMBED_MAX_BATCH_SIZE", 32))
+QUERY_EMBED_MAX_IN_FLIGHT = int(os.getenv("QUERY_EMBED_MAX_IN_FLIGHT", 4))
+# Longest a caller waits for its batch, including provider queueing and retries
+QUERY_EMBED_TIMEOUT = float(os.getenv("QUERY_EMBED_TIMEOUT", 120.0))
+
+# Shared embeddings model instance
+_embeddings_model = None
+_lock = threading.Lock()
+
+
+class QueryEmbeddingBatcher:
+    """Coalesces concurrent query embeddings into batched embedding calls.
+
+    The first query to arrive opens a short window; every query arriving within
+    it (up to a maximum batch size) is embedded in a single call and the vectors
+    are handed back to the waiting callers.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[str]], List[List[float]]],
+        window_ms: float = QUERY_EMBED_BATCH_WINDOW_MS,
+        max_batch_size: int = QUERY_EMBED_MAX_BATCH_SIZE,
+        max_in_flight: int = QUERY_EMBED_MAX_IN_FLIGHT,
+        timeout: float = QUERY_EMBED_TIMEOUT
+    ):
+        """Initialize the batcher.
+
+        Args:
+            batch_fn: Callable embedding a list of queries in one call
+            window_ms: How long to wait for more queries after the first one arrives
+            max_batch_size: Maximum number of queries per batched call
+            max_in_flight: Maximum number of batched calls running at once
+            timeout: Seconds a caller waits for its embedding before giving up
+        """
+        self.batch_fn = batch_fn
+        self.timeout = timeout
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._pending: List[Tuple[str, Future, float]] = []
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="query-embed")
+        self._worker: Optional[threading.Thread] = None
+
+        # Instrumentation
+        self._batches = 0
+        self._queries = 0
+        self._max_batch = 0
+        self._total_wait = 0.0
+        self._total_call = 0.0
+
+    def embed(self, text: str) -> List[float]:
+        """Embed a query, blocking until its batch has been embedded.
+
+        Raises:
+            TimeoutError: If the batch is not embedded within the timeout
+        """
+        future: Future = Future()
+        with self._condition:
+            self._pending.append((text, future, time.monotonic()))
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._collect, name="query-embed-batcher", daemon=True)
+                self._worker.start()
+            self._condition.notify()
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Drop the query if its batch has not started yet
+            future.cancel()
+            raise TimeoutError(f"Query embedding timed out after {self.timeout:.0f}s")
+
+    def metrics(self) -> Dict[str, Any]:
+        """Get batch size and added wait statistics."""
+        with self._condition:
+            return {
+                "batches": self._batches,
+                "queries": self._queries,
+                "avg_batch_size": self._queries / self._batches if self._batches else 0.0,
+                "max_batch_size": self._max_batch,
+                "avg_added_wait_ms": 1000 * self._total_wait / self._queries if self._queries else 0.0,
+                "avg_call_ms": 1000 * self._total_call / self._batches if self._batches else 0.0,
+            }
+
+    def _collect(self) -> None:
+        """Gather pending queries into batches and dispatch them."""
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = self._pending[0][2] + self.window
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+            self._executor.submit(self._flush, batch)
+
+    def _flush(self, batch: List[Tuple[str, Future, float]]) -> None:
+        """Embed one batch and resolve its callers' futures.
+
+        Every future is resolved, with the call's error if it fails, so no caller
+        is left waiting.
+        """
+        # Skip queries whose callers timed out before the batch started
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        start = time.monotonic()
+        error: Optional[BaseException] = None
+        try:
+            # Identical queries in the same window share one embedding
+            texts = list(dict.fromkeys(text for text, _, _ in batch))
+            embedded = self.batch_fn(texts)
+            if len(embedded) != len(texts):
+                raise ValueError(f"Embedding call returned {len(embedded)} vectors for {len(texts)} queries")
+            vectors = dict(zip(texts, embedded))
+            for text, future, _ in batch:
+                future.set_result(vectors[text])
+        except Exception as e:
+            error = e
+        finally:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(error or RuntimeError("Query embedding batch was interrupted"))
+
+            with self._condition:
+                self._batches += 1
+                self._queries += len(batch)
+                self._max_batch = max(self._max_batch, len(batch))
+                self._total_wait += sum(start - queued_at for _, _, queued_at in batch)
+                self._total_call += time.monotonic() - start
+
+
+class GatedEmbeddings(Embeddings):
+    """Embeddings wrapper that routes every call through a provider gate."""
+
+    def __init__(self, embeddings: Embeddings, gate: ProviderGate, batcher: Optional[QueryEmbeddingBatcher] = None):
+        """Initialize the wrapper.
+
+        Args:
+            embeddings: Underlying embeddings model
+            gate: Gate limiting calls to the embeddings provider
+            batcher: Optional batcher that coalesces concurrent query embeddings
+        """
+        self.embeddings = embeddings
+        self.gate = gate
+        self.batcher = batcher
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of documents."""
+        return self.gate.call(self.embeddings.embed_documents, texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query."""
+        if self.batcher is not None:
+            return self.batcher.embed(text)
+        return self.gate.call(self.embeddings.embed_query, text)
+
+
+def get_query_batching_metrics() -> Optional[Dict[str, Any]]:
+    """Get query embedding batching metrics, or None if batching is not active."""
+    if _embeddings_model is None or _embeddings_model.batcher is None:
+        return None
+    return _embeddings_model.batcher.metrics()
+
+
 def get_embeddings_model():
-    """Get the embeddings model.
-    
+    """Get the shared embeddings model.
+
     Returns:
         Embeddings model instance
     """
-    if not GEMINI_API_KEY:
-        raise ValueError("GEMINI_API_KEY environment variable is not set")
-    
-
-    return GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001",
-        google_api_key=SecretStr(GEMINI_API_KEY)
-    )
\ No newline at end of file
+    global _embeddings_model
+
+    with _lock:
+        if _embeddings_model is None:
+            if not GEMINI_API_KEY:
+                raise ValueError("GEMINI_API_KEY environment variable is not set")
+            _embeddings_model = _build_embeddings_model(
+                GoogleGenerativeAIEmbeddings(
+                    model=EMBEDDING_MODEL,
+                    google_api_key=SecretStr(GEMINI_API_KEY)
+                ),
+                # Batched queries keep the query task type used by embed_query
+                batch_kwargs={"task_type": "retrieval_query"}
+            )
+
+    return _embeddings_model
+
+
+def set_embeddings_model(embeddings: Embeddings) -> None:
+    """Replace the shared embeddings model, e.g. with a stand-in backend for load tests.
+
+    The model is wrapped with the same provider gate and query batching as the
+    default one. Must be called before any agent is created.
+    """
+    global _embeddings_model
+
+    with _lock:
+        _embeddings_model = _build_embeddings_model(embeddings)
+
+
+def _build_embeddings_model(embeddings: Embeddings, batch_kwargs: Optional[Dict[str, Any]] = None) -> GatedEmbeddings:
+    """Wrap an embeddings model with the Gemini gate and, if enabled, query batching."""
+    gate = get_gate("gemini")
+    batcher = None
+    if QUERY_EMBED_BATCH_WINDOW_MS > 0:
+        batcher = QueryEmbeddingBatcher(
+            lambda texts: gate.call(embeddings.embed_documents, texts, **(batch_kwargs or {}))
+        )
+    return GatedEmbeddings(embeddings, gate, batcher)
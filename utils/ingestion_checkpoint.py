@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Get environment variables
+CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+INGESTION_CHECKPOINT_DIRECTORY = os.getenv("INGESTION_CHECKPOINT_DIRECTORY", os.path.join(CHROMA_PERSIST_DIRECTORY, "ingestion"))
+
+# Checkpoint states
+STATUS_PARTIAL = "partial"
+STATUS_COMPLETE = "complete"
+
+
+def document_fingerprint(document_path: str) -> str:
+    """Get a stable ID for a document from its content.
+
+    Uploads are saved under a new temporary path each time, so the content hash
+    is what lets a retried upload find its earlier progress.
+    """
+    digest = hashlib.sha256()
+    with open(document_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:32]
+
+
+class IngestionCheckpoints:
+    """Per-document progress manifests for resumable ingestion.
+
+    Each document has a small JSON manifest recording how its text was chunked
+    and how many chunks have been committed to the vector store. It is rewritten
+    atomically after every committed batch, so a retry can skip straight to the
+    first batch that was not stored.
+    """
+
+    def __init__(self, directory: str = INGESTION_CHECKPOINT_DIRECTORY):
+        """Initialize the checkpoint store.
+
+        Args:
+            directory: Directory holding one manifest per document
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Optional[Dict[str, Any]]] = {}
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Get a document's checkpoint, or None if it has none."""
+        with self._lock:
+            if document_id not in self._cache:
+                path = self._path(document_id)
+                checkpoint = None
+                if os.path.exists(path):
+                    with open(path, "r", encoding="utf-8") as f:
+                        checkpoint = json.load(f)
+                self._cache[document_id] = checkpoint
+            checkpoint = self._cache[document_id]
+            return dict(checkpoint) if checkpoint else None
+
+    def start(self, document_id: str, source: str, document_path: str, num_chunks: int, chunk_size: int, chunk_overlap: int) -> Dict[str, Any]:
+        """Start (or restart from zero) a document's checkpoint."""
+        checkpoint = {
+            "document_id": document_id,
+            "source": source,
+            "document_path": document_path,
+            "num_chunks": num_chunks,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "chunks_committed": 0,
+            "status": STATUS_PARTIAL if num_chunks else STATUS_COMPLETE,
+            "attempts": 1,
+        }
+        self._save(checkpoint)
+        return checkpoint
+
+    def resume(self, checkpoint: Dict[str, Any], document_path: str) -> Dict[str, Any]:
+        """Record a new attempt on an existing checkpoint."""
+        checkpoint = {**checkpoint, "document_path": document_path, "attempts": checkpoint.get("attempts", 0) + 1}
+        self._save(checkpoint)
+        return checkpoint
+
+    def commit(self, checkpoint: Dict[str, Any], chunks_committed: int) -> Dict[str, Any]:
+        """Record that the first chunks_committed chunks are stored."""
+        status = STATUS_COMPLETE if chunks_committed >= checkpoint["num_chunks"] else STATUS_PARTIAL
+        checkpoint = {**checkpoint, "chunks_committed": chunks_committed, "status": status}
+        self._save(checkpoint)
+        return checkpoint
+
+    def remove(self, document_id: str) -> None:
+        """Forget a document's progress so it is ingested from scratch next time."""
+        path = self._path(document_id)
+        if os.path.exists(path):
+            os.remove(path)
+        with self._lock:
+            self._cache[document_id] = None
+
+    def is_partial(self, document_id: str) -> bool:
+        """Check whether a document is only partially ingested."""
+        checkpoint = self.get(document_id)
+        return bool(checkpoint) and checkpoint["status"] == STATUS_PARTIAL
+
+    def _save(self, checkpoint: Dict[str, Any]) -> None:
+        """Atomically write a checkpoint to disk."""
+        checkpoint["updated_at"] = time.time()
+        path = self._path(checkpoint["document_id"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._cache[checkpoint["document_id"]] = dict(checkpoint)
+
+    def _path(self, document_id: str) -> str:
+        """Get the manifest path for a document."""
+        return os.path.join(self.directory, f"{document_id}.json")
+
+
+# Global checkpoint store instance
+_checkpoints = None
+_checkpoints_lock = threading.Lock()
+
+def get_ingestion_checkpoints() -> IngestionCheckpoints:
+    """Get the shared ingestion checkpoint store."""
+    global _checkpoints
+
+    with _checkpoints_lock:
+        if _checkpoints is None:
+            _checkpoints = IngestionCheckpoints()
+    return _checkpoints
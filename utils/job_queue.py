@@ -0,0 +1,201 @@
+import os
+import time
+import uuid
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Get environment variables
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", 2))
+# Number of finished jobs kept for status polling
+INGESTION_JOB_HISTORY = int(os.getenv("INGESTION_JOB_HISTORY", 200))
+
+# Job lifecycle states
+JOB_QUEUED = "queued"
+JOB_PARSING = "parsing"
+JOB_EMBEDDING = "embedding"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+ACTIVE_JOB_STATES = (JOB_QUEUED, JOB_PARSING, JOB_EMBEDDING)
+
+
+class IngestionJobQueue:
+    """Queue that runs document ingestion jobs on background worker threads.
+
+    A single queue is shared by every session in the process (see
+    get_ingestion_job_queue), so max_workers bounds ingestion concurrency for
+    the whole process. Finished jobs are kept for status polling until more than
+    max_history jobs have finished, then the oldest are evicted.
+    """
+
+    def __init__(self, max_workers: int = INGESTION_WORKERS, max_history: int = INGESTION_JOB_HISTORY):
+        """Initialize the job queue.
+
+        Args:
+            max_workers: Number of worker threads processing jobs concurrently
+            max_history: Number of finished jobs kept before the oldest are evicted
+        """
+        self.max_history = max_history
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._handlers: Dict[str, Callable[[str, str], Dict[str, Any]]] = {}
+        self._finished: deque = deque()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion")
+
+    def submit(self, document_path: str, handler: Callable[[str, str], Dict[str, Any]]) -> str:
+        """Queue a document for ingestion.
+
+        Args:
+            document_path: Path to the document
+            handler: Callable taking (job_id, document_path) that ingests the document
+                and returns the ingestion result payload
+
+        Returns:
+            ID of the queued job
+        """
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            self._handlers[job_id] = handler
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "document_path": document_path,
+                "source": os.path.basename(document_path),
+                "status": JOB_QUEUED,
+                "chunks_total": None,
+                "chunks_embedded": 0,
+                "chunks_resumed": 0,
+                "partial": False,
+                "queued_at": time.time(),
+                "started_at": None,
+                "embedding_started_at": None,
+                "finished_at": None,
+                "error": None,
+            }
+        self._executor.submit(self._run, job_id, document_path)
+        return job_id
+
+    def report_progress(self, job_id: str, stage: str, **info: Any) -> None:
+        """Record progress reported by the ingestion pipeline for a job.
+
+        Args:
+            job_id: ID of the job
+            stage: Pipeline stage ("parsed" or "embedded")
+            info: Stage details such as chunks_total and chunks_embedded
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            if stage == "parsed":
+                job["status"] = JOB_EMBEDDING
+                job["embedding_started_at"] = time.time()
+                # Chunks committed by an earlier attempt don't count towards throughput
+                job["chunks_resumed"] = info.get("chunks_embedded", 0)
+            job.update(info)
+
+    def retry(self, job_id: str) -> Optional[str]:
+        """Queue a failed job's document again; ingestion resumes from its last committed batch.
+
+        Returns:
+            ID of the new job, or None if the job is unknown or has not failed
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != JOB_FAILED:
+                return None
+            document_path = job["document_path"]
+            handler = self._handlers[job_id]
+        return self.submit(document_path, handler)
+
+    def progress_callback(self, job_id: str) -> Callable[..., None]:
+        """Get a progress callback bound to a job."""
+        return lambda stage, **info: self.report_progress(job_id, stage, **info)
+
+    def get_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a snapshot of a job's status, or None if the job is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return self._snapshot(job)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """Get status snapshots for all jobs in submission order."""
+        with self._lock:
+            return [self._snapshot(job) for job in self._jobs.values()]
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting jobs and release the worker threads."""
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job_id: str, document_path: str) -> None:
+        """Run a single job on a worker thread."""
+        with self._lock:
+            self._jobs[job_id]["status"] = JOB_PARSING
+            self._jobs[job_id]["started_at"] = time.time()
+            handler = self._handlers[job_id]
+
+        try:
+            result = handler(job_id, document_path) or {}
+            error = result.get("error")
+        except Exception as e:
+            result = {}
+            error = f"Error processing document: {str(e)}"
+
+        with self._lock:
+            job = self._jobs[job_id]
+            job["finished_at"] = time.time()
+            if error:
+                job["status"] = JOB_FAILED
+                job["error"] = error
+                # Some chunks are stored and searchable, but the document is incomplete
+                job["partial"] = result.get("chunks_committed", 0) > 0
+            else:
+                job["status"] = JOB_COMPLETED
+
+            # Evict the oldest finished jobs
+            self._finished.append(job_id)
+            while len(self._finished) > self.max_history:
+                evicted = self._finished.popleft()
+                self._jobs.pop(evicted, None)
+                self._handlers.pop(evicted, None)
+
+    def _snapshot(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy a job record and add derived timing metrics."""
+        snapshot = dict(job)
+        now = job["finished_at"] or time.time()
+
+        # Chunks per second over the embedding stage
+        throughput = 0.0
+        if job["embedding_started_at"] and job["chunks_embedded"]:
+            elapsed = now - job["embedding_started_at"]
+            if elapsed > 0:
+                throughput = (job["chunks_embedded"] - job["chunks_resumed"]) / elapsed
+        snapshot["chunks_per_second"] = throughput
+
+        snapshot["queue_seconds"] = (job["started_at"] or now) - job["queued_at"]
+        snapshot["progress"] = (
+            job["chunks_embedded"] / job["chunks_total"] if job["chunks_total"] else
+            (1.0 if job["status"] == JOB_COMPLETED else 0.0)
+        )
+        return snapshot
+
+
+# Global job queue instance
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_ingestion_job_queue() -> IngestionJobQueue:
+    """Get the ingestion job queue shared by all sessions in the process."""
+    global _job_queue
+
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = IngestionJobQueue()
+    return _job_queue
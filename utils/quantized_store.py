@@ -0,0 +1,506 @@
+import uuid
+import tempfile
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+# Supported compressed representations for the first-pass search
+QUANTIZATION_MODES = ("float16", "int8", "pq")
+
+# Number of product quantization centroids per subspace (codes fit in one byte)
+PQ_CENTROIDS = 256
+
+# Rows scored per block during a scan, bounding temporary memory
+# (8192 rows of 768-dim float32 is 24 MB per concurrent search)
+SCAN_BLOCK_SIZE = 8192
+
+# Reclaim deleted and replaced rows once at least this many are dead and they
+# make up at least this fraction of all rows
+COMPACT_MIN_DEAD_ROWS = 1024
+COMPACT_DEAD_FRACTION = 0.25
+
+# Recent search queries kept as a held-out set for recall measurement
+RECALL_QUERY_HISTORY = 256
+
+# Noise added to stored vectors when they stand in for queries in recall measurement
+RECALL_QUERY_NOISE = 0.5
+
+
+def _kmeans(data: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Cluster rows of data into k centroids with Lloyd's algorithm."""
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(data, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        counts = np.bincount(assign, minlength=k)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Get the index of the nearest centroid for each row of data."""
+    distances = -2 * data @ centroids.T + (centroids ** 2).sum(axis=1)[None, :]
+    return distances.argmin(axis=1)
+
+
+class _ScanView(NamedTuple):
+    """Consistent view of the store's arrays that a search can scan without the lock.
+
+    Writers only append rows past size, replace arrays with new ones (growth,
+    compaction, PQ training) or flip live flags, so a view taken under the lock
+    stays valid: live is copied and everything else is referenced.
+    """
+    size: int
+    live: np.ndarray
+    codes: Optional[np.ndarray]
+    scales: np.ndarray
+    codebooks: Optional[np.ndarray]
+    full: Optional[np.ndarray]
+    ids: List[str]
+    texts: List[str]
+    metadatas: List[Dict[str, Any]]
+
+
+class QuantizedVectorStore(VectorStore):
+    """In-process vector store that searches compressed vectors and re-ranks exactly.
+
+    Vectors are L2-normalized and stored twice:
+
+    - compressed codes in memory (float16, per-vector scaled int8, or product
+      quantization codes), scanned for the first-pass search
+    - full-precision float32 rows in a memory-mapped temporary file, read only
+      for the small candidate set that is re-ranked exactly
+
+    Deleted and replaced rows are reclaimed by compaction once enough of them
+    accumulate. Searches hold the lock only to take a view of the arrays, so
+    concurrent searches scan in parallel. Scores are cosine similarities. Product quantization codebooks are trained
+    once pq_train_size vectors have been added; until then searches are exact.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        mode: str = "int8",
+        rerank_factor: int = 4,
+        pq_subvectors: int = 48,
+        pq_train_size: int = 1024,
+        directory: Optional[str] = None
+    ):
+        """Initialize the store.
+
+        Args:
+            embedding: Embeddings model used for texts and queries
+            mode: Compressed representation ("float16", "int8" or "pq")
+            rerank_factor: Candidates re-ranked at full precision, as a multiple of k
+            pq_subvectors: Number of subspaces (bytes per vector) for product quantization
+            pq_train_size: Number of vectors needed before training product quantization
+            directory: Directory for the memory-mapped full-precision vectors
+                (the system temporary directory by default)
+        """
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unsupported quantization mode: {mode}")
+        self._embedding = embedding
+        self.mode = mode
+        self.rerank_factor = rerank_factor
+        self.pq_subvectors = pq_subvectors
+        self.pq_train_size = pq_train_size
+        self._lock = threading.RLock()
+
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._rows: Dict[str, int] = {}
+        self._size = 0
+        self._dimension: Optional[int] = None
+        self._live = np.zeros(0, dtype=bool)
+
+        # Compressed codes (and per-vector scales for int8)
+        self._codes: Optional[np.ndarray] = None
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._codebooks: Optional[np.ndarray] = None
+
+        # Full-precision vectors, memory-mapped from an anonymous temporary file
+        # that the OS removes when it is closed or the process exits
+        self._directory = directory
+        self._full_file = None
+        self._full: Optional[np.memmap] = None
+
+        # Normalized embeddings of recent search queries
+        self._recent_queries: deque = deque(maxlen=RECALL_QUERY_HISTORY)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        """Embeddings model used by the store."""
+        return self._embedding
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, **kwargs: Any) -> "QuantizedVectorStore":
+        """Create a store from texts."""
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas)
+        return store
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """Embed texts and add them to the store."""
+        texts = list(texts)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        self.upsert(ids, self._embedding.embed_documents(texts), texts, metadatas)
+        return ids
+
+    def upsert(self, ids: List[str], embeddings: Any, documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Add precomputed embeddings, replacing rows with the same ids."""
+        if not len(ids):
+            return
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            if self._dimension is None:
+                self._dimension = vectors.shape[1]
+            self._reserve(self._size + len(ids))
+            start, end = self._size, self._size + len(ids)
+
+            for chunk_id in ids:
+                if chunk_id in self._rows:
+                    self._live[self._rows[chunk_id]] = False
+            for offset, chunk_id in enumerate(ids):
+                self._rows[chunk_id] = start + offset
+            self._ids.extend(ids)
+            self._texts.extend(documents)
+            self._metadatas.extend(metadatas)
+
+            self._full[start:end] = vectors
+            self._live[start:end] = True
+            self._size = end
+
+            if self.mode == "pq" and self._codebooks is None:
+                if self._live[:self._size].sum() >= self.pq_train_size:
+                    self._train_pq()
+            else:
+                self._encode(start, end)
+            self.maybe_compact()
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Delete rows by id."""
+        with self._lock:
+            for chunk_id in ids or []:
+                row = self._rows.pop(chunk_id, None)
+                if row is not None:
+                    self._live[row] = False
+            self.maybe_compact()
+        return True
+
+    def maybe_compact(self) -> bool:
+        """Compact the store if enough rows are dead, returning whether it did."""
+        with self._lock:
+            dead = self._size - len(self._rows)
+            if dead < COMPACT_MIN_DEAD_ROWS or dead < COMPACT_DEAD_FRACTION * self._size:
+                return False
+            self.compact()
+            return True
+
+    def compact(self) -> None:
+        """Drop deleted and replaced rows from the codes, the texts and the full-precision file."""
+        with self._lock:
+            keep = np.flatnonzero(self._live[:self._size])
+            if len(keep) == self._size:
+                return
+            self._ids = [self._ids[row] for row in keep]
+            self._texts = [self._texts[row] for row in keep]
+            self._metadatas = [self._metadatas[row] for row in keep]
+            self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+
+            capacity = max(len(keep), 1024)
+            codes = np.zeros((capacity,) + self._codes.shape[1:], dtype=self._codes.dtype)
+            codes[:len(keep)] = self._codes[keep]
+            scales = np.zeros(capacity, dtype=np.float32)
+            scales[:len(keep)] = self._scales[keep]
+            live = np.zeros(capacity, dtype=bool)
+            live[:len(keep)] = True
+
+            # Copy live full-precision rows into a new file, then release the old one
+            full_file = self._open_full_file(capacity)
+            full = np.memmap(full_file, dtype=np.float32, mode="r+", shape=(capacity, self._dimension))
+            for start in range(0, len(keep), SCAN_BLOCK_SIZE):
+                end = min(start + SCAN_BLOCK_SIZE, len(keep))
+                full[start:end] = self._full[keep[start:end]]
+            self._close_full_file()
+            self._full_file, self._full = full_file, full
+
+            self._codes, self._scales, self._live = codes, scales, live
+            self._size = len(keep)
+
+    def get_ids(self, where: Dict[str, Any]) -> List[str]:
+        """Get ids of live rows whose metadata matches every key in where."""
+        with self._lock:
+            return [
+                chunk_id for chunk_id, row in self._rows.items()
+                if all(self._metadatas[row].get(key) == value for key, value in where.items())
+            ]
+
+    def get_metadatas(self, where: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Get metadata of live rows whose metadata matches every key in where."""
+        with self._lock:
+            return [self._metadatas[self._rows[chunk_id]] for chunk_id in self.get_ids(where)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        """Return the documents most similar to the query."""
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """Return the documents most similar to the query with their cosine similarity."""
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        """Return the documents most similar to an embedding."""
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        """Search compressed vectors, then re-rank the best candidates at full precision."""
+        query = self._normalize(np.asarray([embedding], dtype=np.float32))[0]
+        with self._lock:
+            self._recent_queries.append(query)
+            view = self._view()
+        rows, scores = self._search(view, query, k)
+        return [
+            (Document(page_content=view.texts[row], metadata=view.metadatas[row], id=view.ids[row]), float(score))
+            for row, score in zip(rows, scores)
+        ]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        """Scores are cosine similarities; clamp them to [0, 1] as relevance."""
+        return lambda score: max(0.0, min(1.0, score))
+
+    def memory_report(self) -> Dict[str, Any]:
+        """Get the memory used per chunk by compressed and full-precision vectors."""
+        with self._lock:
+            dimension = self._dimension or 0
+            live = len(self._rows)
+            full_bytes = 4 * dimension
+            if self.mode == "float16":
+                code_bytes = 2 * dimension
+            elif self.mode == "int8":
+                code_bytes = dimension + 4
+            else:
+                code_bytes = self.pq_subvectors if self._codebooks is not None else full_bytes
+            codebook_bytes = self._codebooks.nbytes if self._codebooks is not None else 0
+            return {
+                "mode": self.mode,
+                "chunks": live,
+                "dead_chunks": self._size - live,
+                "dimension": dimension,
+                "full_precision_bytes_per_chunk": full_bytes,
+                "compressed_bytes_per_chunk": code_bytes,
+                "compression_ratio": full_bytes / code_bytes if code_bytes else 0.0,
+                # Dead rows occupy memory until the next compaction
+                "resident_bytes": code_bytes * self._size + codebook_bytes,
+                "memory_mapped_bytes": full_bytes * self._size,
+            }
+
+    def recall_report(self, k: int = 5, num_queries: int = 100, seed: int = 0, queries: Optional[Any] = None) -> Dict[str, Any]:
+        """Measure recall@k of the compressed search against exact full-precision search.
+
+        Stored vectors would trivially find themselves, so queries are held out:
+        the given query embeddings, else the most recent search queries, else
+        stored vectors with added noise. Recall is reported both for the
+        first-pass compressed scan alone and after full-precision re-ranking.
+
+        Args:
+            k: Number of results compared per query
+            num_queries: Maximum number of queries measured
+            seed: Random seed for sampling and noise
+            queries: Query embeddings to measure with
+        """
+        with self._lock:
+            live_rows = np.flatnonzero(self._live[:self._size])
+            if not len(live_rows):
+                return {"mode": self.mode, "k": k, "queries": 0}
+            rng = np.random.default_rng(seed)
+
+            if queries is not None:
+                source = "given"
+                queries = self._normalize(np.asarray(queries, dtype=np.float32))
+            elif self._recent_queries:
+                source = "recent_searches"
+                queries = np.array(self._recent_queries)
+            else:
+                source = "perturbed_stored_vectors"
+                sample = np.sort(rng.choice(live_rows, min(num_queries, len(live_rows)), replace=False))
+                vectors = np.asarray(self._full[sample])
+                noise = rng.standard_normal(vectors.shape).astype(np.float32)
+                noise *= RECALL_QUERY_NOISE / np.linalg.norm(noise, axis=1, keepdims=True)
+                queries = self._normalize(vectors + noise)
+            if len(queries) > num_queries:
+                queries = queries[rng.choice(len(queries), num_queries, replace=False)]
+            view = self._view()
+
+        first_pass, reranked = [], []
+        for query in queries:
+            exact = set(self._top(view, self._exact_scores(view, query), k))
+            approximate = self._top(view, self._approximate_scores(view, query), k)
+            first_pass.append(len(exact.intersection(approximate)) / len(exact))
+            rows, _ = self._search(view, query, k)
+            reranked.append(len(exact.intersection(rows)) / len(exact))
+
+        return {
+            "mode": self.mode,
+            "k": k,
+            "queries": len(queries),
+            "query_source": source,
+            "recall_at_k_first_pass": float(np.mean(first_pass)),
+            "recall_at_k_reranked": float(np.mean(reranked)),
+        }
+
+    def _view(self) -> _ScanView:
+        """Take a view of the arrays for scanning; call with the lock held."""
+        return _ScanView(
+            size=self._size,
+            live=self._live[:self._size].copy(),
+            codes=self._codes,
+            scales=self._scales,
+            codebooks=self._codebooks,
+            full=self._full,
+            ids=self._ids,
+            texts=self._texts,
+            metadatas=self._metadatas
+        )
+
+    def _search(self, view: _ScanView, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the top-k rows and their exact scores for a normalized query."""
+        if not view.size:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        candidates = np.sort(self._top(view, self._approximate_scores(view, query), k * self.rerank_factor))
+        exact = np.asarray(view.full[candidates]) @ query
+        order = np.argsort(-exact)[:k]
+        return candidates[order], exact[order]
+
+    def _top(self, view: _ScanView, scores: np.ndarray, k: int) -> np.ndarray:
+        """Get the indices of the k highest live scores, best first."""
+        scores = np.where(view.live, scores, -np.inf)
+        k = min(k, int(view.live.sum()))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def _exact_scores(self, view: _ScanView, query: np.ndarray) -> np.ndarray:
+        """Score all rows at full precision."""
+        return np.concatenate([
+            np.asarray(view.full[start:min(start + SCAN_BLOCK_SIZE, view.size)]) @ query
+            for start in range(0, view.size, SCAN_BLOCK_SIZE)
+        ])
+
+    def _approximate_scores(self, view: _ScanView, query: np.ndarray) -> np.ndarray:
+        """Score all rows using their compressed codes."""
+        if self.mode == "pq" and view.codebooks is None:
+            return self._exact_scores(view, query)
+
+        if self.mode == "pq":
+            # Asymmetric distance: per-subspace lookup tables of centroid/query products
+            tables = np.einsum("mkd,md->mk", view.codebooks, self._split(query[None, :])[0])
+            subspaces = np.arange(self.pq_subvectors)[None, :]
+
+        blocks = []
+        for start in range(0, view.size, SCAN_BLOCK_SIZE):
+            end = min(start + SCAN_BLOCK_SIZE, view.size)
+            codes = view.codes[start:end]
+            if self.mode == "float16":
+                blocks.append(codes.astype(np.float32) @ query)
+            elif self.mode == "int8":
+                blocks.append((codes.astype(np.float32) @ query) * view.scales[start:end])
+            else:
+                blocks.append(tables[subspaces, codes].sum(axis=1))
+        return np.concatenate(blocks)
+
+    def _encode(self, start: int, end: int) -> None:
+        """Compress full-precision rows [start, end) into codes."""
+        vectors = np.asarray(self._full[start:end])
+        if self.mode == "float16":
+            self._codes[start:end] = vectors.astype(np.float16)
+        elif self.mode == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._codes[start:end] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._scales[start:end] = scales
+        else:
+            subvectors = self._split(vectors)
+            for m in range(self.pq_subvectors):
+                self._codes[start:end, m] = _nearest(subvectors[:, m], self._codebooks[m])
+
+    def _train_pq(self) -> None:
+        """Train product quantization codebooks on live rows and encode every row."""
+        rng = np.random.default_rng(0)
+        live_rows = np.flatnonzero(self._live[:self._size])
+        sample = np.sort(rng.choice(live_rows, min(len(live_rows), 16 * PQ_CENTROIDS), replace=False))
+        subvectors = self._split(np.asarray(self._full[sample]))
+        sub_dimension = subvectors.shape[2]
+        codebooks = np.zeros((self.pq_subvectors, PQ_CENTROIDS, sub_dimension), dtype=np.float32)
+        for m in range(self.pq_subvectors):
+            centroids = _kmeans(subvectors[:, m], PQ_CENTROIDS, iterations=10, rng=rng)
+            codebooks[m, :len(centroids)] = centroids
+            # Pad with duplicates when there were fewer samples than centroids
+            codebooks[m, len(centroids):] = centroids[0]
+        # Encode into a new array so searches scanning the old codes are unaffected
+        self._codes = self._codes.copy()
+        self._codebooks = codebooks
+        for start in range(0, self._size, SCAN_BLOCK_SIZE):
+            self._encode(start, min(self._size, start + SCAN_BLOCK_SIZE))
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """Split vectors into pq_subvectors equal subspaces, zero-padding the last."""
+        sub_dimension = -(-vectors.shape[1] // self.pq_subvectors)
+        padded = np.zeros((len(vectors), sub_dimension * self.pq_subvectors), dtype=np.float32)
+        padded[:, :vectors.shape[1]] = vectors
+        return padded.reshape(len(vectors), self.pq_subvectors, sub_dimension)
+
+    def _reserve(self, size: int) -> None:
+        """Grow the code arrays and the full-precision file to hold at least size rows."""
+        capacity = len(self._live)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 1024)
+
+        if self.mode == "float16":
+            codes = np.zeros((capacity, self._dimension), dtype=np.float16)
+        elif self.mode == "int8":
+            codes = np.zeros((capacity, self._dimension), dtype=np.int8)
+        else:
+            codes = np.zeros((capacity, self.pq_subvectors), dtype=np.uint8)
+        if self._codes is not None:
+            codes[:self._size] = self._codes[:self._size]
+        self._codes = codes
+        self._scales = np.concatenate([self._scales, np.zeros(capacity - len(self._scales), dtype=np.float32)])
+        self._live = np.concatenate([self._live, np.zeros(capacity - len(self._live), dtype=bool)])
+
+        # Grow the backing file and remap it
+        if self._full_file is None:
+            self._full_file = self._open_full_file(capacity)
+        else:
+            self._full.flush()
+            self._full_file.truncate(capacity * self._dimension * 4)
+        self._full = np.memmap(self._full_file, dtype=np.float32, mode="r+", shape=(capacity, self._dimension))
+
+    def _open_full_file(self, capacity: int) -> Any:
+        """Create an anonymous temporary file sized for capacity full-precision rows."""
+        full_file = tempfile.TemporaryFile(prefix="quantized-store-", dir=self._directory)
+        full_file.truncate(capacity * self._dimension * 4)
+        return full_file
+
+    def _close_full_file(self) -> None:
+        """Drop the full-precision mapping and close its file; the OS deletes it once unmapped."""
+        self._full = None
+        if self._full_file is not None:
+            self._full_file.close()
+            self._full_file = None
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize rows so dot products are cosine similarities."""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
@@ -0,0 +1,447 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import warnings
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import numpy as np
+
+# Version of the on-disk snapshot layout
+SNAPSHOT_FORMAT_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+SEGMENTS_DIR = "segments"
+VECTORS_FILE = "vectors.npy"
+RECORDS_FILE = "records.jsonl"
+
+# Rows copied at a time when compaction streams segments into a merged one
+COMPACT_COPY_ROWS = 8192
+
+# Batch of (ids, vectors, documents, metadatas)
+Batch = Tuple[List[str], np.ndarray, List[str], List[Dict[str, Any]]]
+
+
+def _fsync_directory(path: str) -> None:
+    """Flush a directory's entries to disk (a no-op where directories cannot be opened)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class VectorSnapshot:
+    """Durable, segment-based snapshot of the vectors held by the vector store.
+
+    Layout of the snapshot directory:
+
+        manifest.json              format version, embedding model and dimension,
+                                   live segments and deleted chunk ids
+        segments/<name>/vectors.npy    float32 matrix, one row per chunk (memory-mappable)
+        segments/<name>/records.jsonl  chunk id, text and metadata, one line per row
+
+    Every committed batch of chunks is written and fsynced as a new segment and then
+    published by atomically replacing the manifest, so an interrupted write never
+    leaves a half-written segment visible. Segments that cannot be read on load
+    (e.g. after disk corruption) are set aside rather than failing startup.
+
+    A chunk id written again in a later segment replaces the earlier row, and
+    deleted chunks are recorded in the manifest. Replaced and deleted rows stay
+    on disk until compaction, which is size-tiered: once compact_segments
+    segments of a similar size exist they are merged into one segment of the
+    next size tier, and any segment whose share of dead rows reaches
+    compact_deleted_ratio is rewritten. Each row is therefore rewritten about
+    log(rows) times, and merges stream rows to disk instead of loading them.
+    """
+
+    def __init__(self, directory: str, embedding_model: str, compact_segments: int = 16, compact_deleted_ratio: float = 0.2):
+        """Open (or create) a snapshot directory.
+
+        Args:
+            directory: Snapshot directory
+            embedding_model: Name of the embedding model the vectors come from
+            compact_segments: Merge this many segments of a similar size (within a
+                factor of compact_segments of each other) at a time
+            compact_deleted_ratio: Rewrite a segment once this fraction of its rows is dead
+        """
+        self.directory = directory
+        self.embedding_model = embedding_model
+        self.compact_segments = max(2, compact_segments)
+        self.compact_deleted_ratio = compact_deleted_ratio
+        self._lock = threading.RLock()
+        self._compacting = False
+        self._compaction_lock = threading.Lock()
+
+        # Segments holding a row for each chunk id, oldest first; the last one holds
+        # the live row unless the id is deleted. Built when the snapshot is first loaded.
+        self._locations: Dict[str, List[str]] = {}
+        self._live_rows: Dict[str, int] = {}
+        self._indexed = False
+
+        self._deleted: Set[str] = set()
+        self.manifest = self._load_manifest()
+        self._deleted = set(self.manifest["deleted_ids"])
+
+    def append(self, ids: List[str], vectors: List[List[float]], documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Commit a batch of chunks as a new segment."""
+        if not ids:
+            return
+        self._ensure_index()
+        matrix = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            dimension = self.manifest["dimension"]
+        if dimension is not None and matrix.shape[1] != dimension:
+            raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match snapshot dimension {dimension}")
+
+        name = self._new_segment_name()
+        self._write_segment(name, len(ids), int(matrix.shape[1]), [(ids, matrix, documents, metadatas)])
+
+        with self._lock:
+            if self.manifest["dimension"] is None:
+                self.manifest["dimension"] = int(matrix.shape[1])
+            self.manifest["segments"].append({"name": name, "rows": len(ids)})
+            self._live_rows[name] = 0
+            for chunk_id in ids:
+                locations = self._locations.setdefault(chunk_id, [])
+                # The previous live row of a re-added chunk is now dead
+                if locations and chunk_id not in self._deleted:
+                    self._live_rows[locations[-1]] -= 1
+                locations.append(name)
+                self._live_rows[name] += 1
+                # Re-added chunks are live again
+                self._deleted.discard(chunk_id)
+            self._save_manifest()
+        self.maybe_compact()
+
+    def delete(self, ids: List[str]) -> None:
+        """Mark chunks as deleted; their rows are dropped when their segments are compacted."""
+        if not ids:
+            return
+        self._ensure_index()
+        with self._lock:
+            for chunk_id in ids:
+                locations = self._locations.get(chunk_id)
+                if locations and chunk_id not in self._deleted:
+                    self._live_rows[locations[-1]] -= 1
+                    self._deleted.add(chunk_id)
+            self._save_manifest()
+        self.maybe_compact()
+
+    def load(self) -> Iterator[Batch]:
+        """Yield (ids, vectors, documents, metadatas) for each segment, skipping deleted chunks.
+
+        Segments are yielded oldest first, so upserting them in order keeps the latest
+        row for each chunk id. Vectors are memory-mapped from disk rather than read
+        into memory. Unreadable segments are dropped from the manifest and moved
+        aside with a warning.
+        """
+        with self._lock:
+            segments = list(self.manifest["segments"])
+            deleted = set(self._deleted)
+            indexing = not self._indexed
+        locations: Dict[str, List[str]] = {}
+        for segment in segments:
+            try:
+                ids, vectors, documents, metadatas = self._read_segment(segment["name"])
+                if len(ids) != segment["rows"] or len(vectors) != segment["rows"]:
+                    raise ValueError(f"expected {segment['rows']} rows, found {len(ids)} records and {len(vectors)} vectors")
+            except Exception as e:
+                self._set_aside(segment["name"], e)
+                continue
+            if indexing:
+                for chunk_id in ids:
+                    locations.setdefault(chunk_id, []).append(segment["name"])
+
+            keep = [i for i, chunk_id in enumerate(ids) if chunk_id not in deleted]
+            if len(keep) < len(ids):
+                vectors = vectors[keep]
+                ids = [ids[i] for i in keep]
+                documents = [documents[i] for i in keep]
+                metadatas = [metadatas[i] for i in keep]
+            if ids:
+                yield ids, vectors, documents, metadatas
+        if indexing:
+            self._set_index(locations)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get a summary of the snapshot."""
+        with self._lock:
+            rows = sum(segment["rows"] for segment in self.manifest["segments"])
+            return {
+                "embedding_model": self.manifest["embedding_model"],
+                "dimension": self.manifest["dimension"],
+                "segments": len(self.manifest["segments"]),
+                "rows": rows,
+                "dead_rows": rows - sum(self._live_rows.values()) if self._indexed else None,
+                "deleted": len(self._deleted),
+                "compacting": self._compacting,
+            }
+
+    def maybe_compact(self) -> None:
+        """Start a background compaction if a size tier is full or a segment has too many dead rows."""
+        with self._lock:
+            if self._compacting or not self._indexed:
+                return
+            names = self._plan_compaction()
+            if not names:
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, args=(names,), name="snapshot-compaction", daemon=True).start()
+
+    def compact(self, names: Optional[List[str]] = None) -> None:
+        """Merge segments into one, dropping deleted and replaced rows.
+
+        Appends and deletions made while compaction runs are preserved: new
+        segments are kept as they are and new deletions stay recorded. Only one
+        compaction runs at a time.
+
+        Args:
+            names: Segments to merge (all segments by default)
+        """
+        self._ensure_index()
+        with self._compaction_lock:
+            self._compact(names)
+        # A merge can fill the next size tier
+        self.maybe_compact()
+
+    def _compact(self, names: Optional[List[str]]) -> None:
+        """Merge the given segments that are still in the manifest; see compact()."""
+        with self._lock:
+            self._compacting = True
+            segments = [segment for segment in self.manifest["segments"] if names is None or segment["name"] in names]
+        try:
+            if not segments:
+                return
+            inputs = {segment["name"] for segment in segments}
+
+            # Find the live rows of each input, keeping only the last row of a repeated id
+            kept: List[Tuple[str, List[int]]] = []
+            input_ids: Dict[str, List[str]] = {}
+            for segment in segments:
+                ids = self._read_ids(segment["name"])
+                input_ids[segment["name"]] = ids
+                rows, seen = [], set()
+                with self._lock:
+                    for row in range(len(ids) - 1, -1, -1):
+                        chunk_id = ids[row]
+                        locations = self._locations.get(chunk_id)
+                        if chunk_id in seen or chunk_id in self._deleted or not locations or locations[-1] != segment["name"]:
+                            continue
+                        seen.add(chunk_id)
+                        rows.append(row)
+                kept.append((segment["name"], rows[::-1]))
+
+            # Stream the kept rows into the merged segment
+            name = self._new_segment_name()
+            total = sum(len(rows) for _, rows in kept)
+            if total:
+                self._write_segment(name, total, self.manifest["dimension"], self._kept_batches(kept))
+            merged_ids = {input_ids[segment][row] for segment, rows in kept for row in rows}
+
+            with self._lock:
+                # Replace the inputs by the merged segment in each id's locations; rows
+                # dropped by the merge disappear, and ids left without rows need no deletion record
+                for chunk_id in {chunk_id for ids in input_ids.values() for chunk_id in ids}:
+                    locations = self._locations.get(chunk_id, [])
+                    positions = [i for i, location in enumerate(locations) if location in inputs]
+                    if not positions:
+                        continue
+                    remaining = [location for location in locations if location not in inputs]
+                    if chunk_id in merged_ids:
+                        remaining.insert(positions[-1] - len(positions) + 1, name)
+                    if remaining:
+                        self._locations[chunk_id] = remaining
+                    else:
+                        self._locations.pop(chunk_id, None)
+                        self._deleted.discard(chunk_id)
+                for input_name in inputs:
+                    self._live_rows.pop(input_name, None)
+                if total:
+                    self._live_rows[name] = sum(
+                        1 for chunk_id in merged_ids
+                        if chunk_id not in self._deleted and self._locations[chunk_id][-1] == name
+                    )
+
+                # The merged segment takes the place of the newest input, keeping newer rows after it
+                current = self.manifest["segments"]
+                position = max(i for i, segment in enumerate(current) if segment["name"] in inputs)
+                merged = [{"name": name, "rows": total}] if total else []
+                self.manifest["segments"] = (
+                    [segment for segment in current[:position] if segment["name"] not in inputs]
+                    + merged
+                    + current[position + 1:]
+                )
+                self._save_manifest()
+
+            for input_name in inputs:
+                shutil.rmtree(self._segment_path(input_name), ignore_errors=True)
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _plan_compaction(self) -> List[str]:
+        """Choose the segments to compact next; call with the lock held."""
+        segments = self.manifest["segments"]
+        plan = [
+            segment["name"] for segment in segments
+            if segment["rows"] and 1 - self._live_rows.get(segment["name"], 0) / segment["rows"] >= self.compact_deleted_ratio
+        ]
+        tiers: Dict[int, List[str]] = {}
+        for segment in segments:
+            tiers.setdefault(self._tier(segment["rows"]), []).append(segment["name"])
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= self.compact_segments:
+                plan.extend(name for name in tiers[tier][:self.compact_segments] if name not in plan)
+                break
+        return plan
+
+    def _tier(self, rows: int) -> int:
+        """Get the size tier of a segment: segments in a tier are within a factor of compact_segments."""
+        tier = 0
+        while rows >= self.compact_segments:
+            rows //= self.compact_segments
+            tier += 1
+        return tier
+
+    def _kept_batches(self, kept: List[Tuple[str, List[int]]]) -> Iterator[Batch]:
+        """Yield the kept rows of each segment in blocks."""
+        for name, rows in kept:
+            if not rows:
+                continue
+            ids, vectors, documents, metadatas = self._read_segment(name)
+            for start in range(0, len(rows), COMPACT_COPY_ROWS):
+                block = rows[start:start + COMPACT_COPY_ROWS]
+                yield (
+                    [ids[row] for row in block],
+                    np.asarray(vectors[block]),
+                    [documents[row] for row in block],
+                    [metadatas[row] for row in block],
+                )
+
+    def _ensure_index(self) -> None:
+        """Build the chunk location index if the snapshot has not been loaded yet."""
+        if not self._indexed:
+            for _ in self.load():
+                pass
+
+    def _set_index(self, locations: Dict[str, List[str]]) -> None:
+        """Install the chunk location index built by a full load."""
+        with self._lock:
+            if self._indexed:
+                return
+            self._locations = locations
+            self._live_rows = {segment["name"]: 0 for segment in self.manifest["segments"]}
+            for chunk_id, names in locations.items():
+                if chunk_id not in self._deleted:
+                    self._live_rows[names[-1]] = self._live_rows.get(names[-1], 0) + 1
+            # Deletions of chunks with no rows on disk no longer need recording
+            self._deleted.intersection_update(locations)
+            self._indexed = True
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        """Read the manifest, starting a new snapshot if none exists or it is incompatible."""
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("format_version") == SNAPSHOT_FORMAT_VERSION and manifest.get("embedding_model") == self.embedding_model:
+                return manifest
+
+            # Keep the old snapshot aside rather than mixing incompatible vectors into it
+            stale = f"{self.directory.rstrip(os.sep)}.stale-{int(time.time())}"
+            warnings.warn(f"Vector snapshot in {self.directory} was built with an incompatible format or embedding model; moved it to {stale}")
+            shutil.move(self.directory, stale)
+
+        os.makedirs(os.path.join(self.directory, SEGMENTS_DIR), exist_ok=True)
+        self.manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "embedding_model": self.embedding_model,
+            "dimension": None,
+            "segments": [],
+            "deleted_ids": [],
+        }
+        self._save_manifest()
+        return self.manifest
+
+    def _save_manifest(self) -> None:
+        """Atomically replace the manifest on disk."""
+        self.manifest["deleted_ids"] = sorted(self._deleted)
+        self.manifest["updated_at"] = time.time()
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _fsync_directory(self.directory)
+
+    def _new_segment_name(self) -> str:
+        """Get a unique, time-ordered segment name."""
+        return f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+
+    def _segment_path(self, name: str) -> str:
+        """Get the directory of a segment."""
+        return os.path.join(self.directory, SEGMENTS_DIR, name)
+
+    def _write_segment(self, name: str, rows: int, dimension: int, batches: Iterable[Batch]) -> None:
+        """Stream batches into a segment's vector matrix and records, and flush them to disk.
+
+        The files and directory entries are fsynced so that once the manifest
+        references the segment, it survives an OS crash intact.
+        """
+        path = self._segment_path(name)
+        os.makedirs(path, exist_ok=True)
+        vectors_path = os.path.join(path, VECTORS_FILE)
+        matrix = np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float32, shape=(rows, dimension))
+        offset = 0
+        with open(os.path.join(path, RECORDS_FILE), "w", encoding="utf-8") as f:
+            for ids, vectors, documents, metadatas in batches:
+                matrix[offset:offset + len(ids)] = vectors
+                offset += len(ids)
+                for chunk_id, document, metadata in zip(ids, documents, metadatas):
+                    f.write(json.dumps({"id": chunk_id, "document": document, "metadata": metadata}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        matrix.flush()
+        del matrix
+        with open(vectors_path, "r+b") as f:
+            os.fsync(f.fileno())
+        _fsync_directory(path)
+        _fsync_directory(os.path.dirname(path))
+
+    def _set_aside(self, name: str, error: Exception) -> None:
+        """Drop an unreadable segment from the manifest and move its files aside."""
+        path = self._segment_path(name)
+        corrupt = f"{path}.corrupt-{int(time.time())}"
+        warnings.warn(f"Vector snapshot segment {name} could not be read ({error}); moved it to {corrupt}")
+        with self._lock:
+            self.manifest["segments"] = [segment for segment in self.manifest["segments"] if segment["name"] != name]
+            self._save_manifest()
+        if os.path.exists(path):
+            shutil.move(path, corrupt)
+
+    def _read_ids(self, name: str) -> List[str]:
+        """Read the chunk id of each row of a segment."""
+        with open(os.path.join(self._segment_path(name), RECORDS_FILE), "r", encoding="utf-8") as f:
+            return [json.loads(line)["id"] for line in f]
+
+    def _read_segment(self, name: str) -> Batch:
+        """Read a segment, memory-mapping its vector matrix."""
+        path = self._segment_path(name)
+        vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        ids, documents, metadatas = [], [], []
+        with open(os.path.join(path, RECORDS_FILE), "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                ids.append(record["id"])
+                documents.append(record["document"])
+                metadatas.append(record["metadata"])
+        return ids, vectors, documents, metadatas
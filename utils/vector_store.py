@@ -1,36 +1,150 @@
 import os
+import threading
 from typing import Dict, List, Any, Optional
 from dotenv import load_dotenv
 from langchain_chroma import Chroma
 from langchain_core.embeddings import Embeddings
 
+from utils.embeddings import EMBEDDING_MODEL
+from utils.quantized_store import QuantizedVectorStore
+from utils.snapshot import VectorSnapshot
+
 # Load environment variables
 load_dotenv()
 
 # Get environment variables
 CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+VECTOR_SNAPSHOT_ENABLED = os.getenv("VECTOR_SNAPSHOT_ENABLED", "true").lower() == "true"
+VECTOR_SNAPSHOT_DIRECTORY = os.getenv("VECTOR_SNAPSHOT_DIRECTORY", os.path.join(CHROMA_PERSIST_DIRECTORY, "snapshot"))
+SNAPSHOT_COMPACT_SEGMENTS = int(os.getenv("SNAPSHOT_COMPACT_SEGMENTS", 16))
+# Compressed storage for the first-pass search: none, float16, int8 or pq
+VECTOR_STORE_QUANTIZATION = os.getenv("VECTOR_STORE_QUANTIZATION", "none")
+QUANTIZATION_RERANK_FACTOR = int(os.getenv("QUANTIZATION_RERANK_FACTOR", 4))
+PQ_SUBVECTORS = int(os.getenv("PQ_SUBVECTORS", 48))
+
+# Maximum number of rows written to the store in a single upsert when restoring
+CHROMA_UPSERT_BATCH_SIZE = 4096
 
 # Ensure the persist directory exists
 os.makedirs(CHROMA_PERSIST_DIRECTORY, exist_ok=True)
 
-# Global vector store instance
+# Global vector store and snapshot instances
 _vector_store = None
+_snapshot: Optional[VectorSnapshot] = None
+_lock = threading.Lock()
 
 def get_vector_store(embeddings: Embeddings):
     """Get the vector store instance.
-    
+
+    On first use the store is restored from the on-disk snapshot, so documents
+    ingested before a restart are searchable without re-embedding them.
+
     Args:
         embeddings: Embeddings model to use
-        
+
     Returns:
         Vector store instance
     """
-    global _vector_store
-    
-    if _vector_store is None:
-        _vector_store = Chroma(
-            # persist_directory=CHROMA_PERSIST_DIRECTORY,
-            embedding_function=embeddings
+    global _vector_store, _snapshot
+
+    with _lock:
+        if _vector_store is None:
+            if VECTOR_STORE_QUANTIZATION == "none":
+                # Cosine distance keeps relevance scores in [0, 1], matching the quantized store
+                _vector_store = Chroma(
+                    embedding_function=embeddings,
+                    collection_metadata={"hnsw:space": "cosine"}
+                )
+            else:
+                _vector_store = QuantizedVectorStore(
+                    embeddings,
+                    mode=VECTOR_STORE_QUANTIZATION,
+                    rerank_factor=QUANTIZATION_RERANK_FACTOR,
+                    pq_subvectors=PQ_SUBVECTORS
+                )
+            if VECTOR_SNAPSHOT_ENABLED:
+                _snapshot = VectorSnapshot(VECTOR_SNAPSHOT_DIRECTORY, EMBEDDING_MODEL, compact_segments=SNAPSHOT_COMPACT_SEGMENTS)
+                for ids, vectors, documents, metadatas in _snapshot.load():
+                    for start in range(0, len(ids), CHROMA_UPSERT_BATCH_SIZE):
+                        end = start + CHROMA_UPSERT_BATCH_SIZE
+                        _upsert(_vector_store, ids[start:end], vectors[start:end], documents[start:end], metadatas[start:end])
+
+    return _vector_store
+
+def add_chunks(vector_store, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str]) -> None:
+    """Embed chunks, add them to the vector store and commit them to the snapshot.
+
+    Args:
+        vector_store: Vector store instance
+        texts: Chunk texts
+        metadatas: Metadata for each chunk
+        ids: Unique ID for each chunk
+    """
+    vectors = vector_store.embeddings.embed_documents(texts)
+    _upsert(vector_store, ids, vectors, texts, metadatas)
+    if _snapshot is not None:
+        _snapshot.append(ids, vectors, texts, metadatas)
+
+def delete_document(vector_store, document_path: str, document_id: Optional[str] = None) -> int:
+    """Remove all chunks of a document from the vector store and the snapshot.
+
+    Args:
+        vector_store: Vector store instance
+        document_path: Path the document was ingested from
+        document_id: Content fingerprint of the document; when given, chunks stored
+            by earlier (resumed) attempts under other paths are removed too
+
+    Returns:
+        Number of chunks removed
+    """
+    where = {"document_id": document_id} if document_id else {"document_path": document_path}
+    if isinstance(vector_store, QuantizedVectorStore):
+        ids = vector_store.get_ids(where)
+    else:
+        ids = vector_store.get(where=where, include=[])["ids"]
+    if ids:
+        vector_store.delete(ids=ids)
+        if _snapshot is not None:
+            _snapshot.delete(ids)
+    return len(ids)
+
+def get_document_ids(vector_store, document_path: str) -> List[str]:
+    """Get the content fingerprints of the chunks stored from a document path."""
+    where = {"document_path": document_path}
+    if isinstance(vector_store, QuantizedVectorStore):
+        metadatas = vector_store.get_metadatas(where)
+    else:
+        metadatas = vector_store.get(where=where, include=["metadatas"])["metadatas"]
+    return sorted({metadata["document_id"] for metadata in metadatas if metadata.get("document_id")})
+
+def has_chunk(vector_store, chunk_id: str) -> bool:
+    """Check whether a chunk is stored in the vector store."""
+    if isinstance(vector_store, QuantizedVectorStore):
+        return bool(vector_store.get_ids({"chunk_id": chunk_id}))
+    return bool(vector_store.get(ids=[chunk_id], include=[])["ids"])
+
+def get_quantization_report(k: int = 5, num_queries: int = 100) -> Optional[Dict[str, Any]]:
+    """Get memory per chunk and recall@k against full precision for the quantized store.
+
+    Returns:
+        Combined memory and recall report, or None if quantization is disabled
+    """
+    if not isinstance(_vector_store, QuantizedVectorStore):
+        return None
+    return {**_vector_store.memory_report(), **_vector_store.recall_report(k=k, num_queries=num_queries)}
+
+def _upsert(vector_store, ids: List[str], vectors: Any, documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+    """Write precomputed embeddings to either store implementation."""
+    if isinstance(vector_store, QuantizedVectorStore):
+        vector_store.upsert(ids, vectors, documents, metadatas)
+    else:
+        vector_store._collection.upsert(
+            ids=ids,
+            embeddings=vectors.tolist() if hasattr(vectors, "tolist") else vectors,
+            documents=documents,
+            metadatas=metadatas
         )
-    
-    return _vector_store
\ No newline at end of file
+
+def get_snapshot_stats() -> Optional[Dict[str, Any]]:
+    """Get a summary of the vector store snapshot, or None if snapshots are disabled."""
+    return _snapshot.stats() if _snapshot is not None else None